@@ -0,0 +1,267 @@
+import asyncio
+import concurrent.futures
+import socket
+import ssl
+import threading
+
+from checks import (HAPPY_EYEBALLS_DELAY, get_tls_context, get_resolver, checks_all_addresses, lookup_certificate,
+                    certificate_record, merge_backends, error_result, attempt_timeout, retry_delay, should_retry,
+                    observe_latency, Deadline, PhaseTimer)
+from resolver import interleave_families
+from targets import split_target
+from workers import BasePool, RateLimiter, DEFAULT_ASYNC_CONCURRENCY, DEFAULT_HOST_INTERVAL, DEFAULT_IP_INTERVAL
+
+RESOLVE_THREADS = 32 # Blocking DNS lookups the event loop runs at once
+
+
+async def _resolve(loop, host, port):
+    """Addresses from the shared DNS cache; lookups run on the loop's executor."""
+    resolver = get_resolver()
+    addresses = resolver.cached(host, port)
+    if addresses is None:
+        addresses = await loop.run_in_executor(None, resolver.resolve, host, port)
+    return addresses
+
+
+async def _first_address(loop, host, port):
+    """The address --ip-interval throttles on, as in workers.first_address(), or None if unresolvable."""
+    try:
+        return (await _resolve(loop, host, port))[0][4][0]
+    except (OSError, UnicodeError, IndexError):
+        return None # The probe reports the resolution error
+
+
+async def _probe(domain_name, host, addresses, context, timer, deadline):
+    """Connects to one of `addresses`, fetches the certificate and returns its result record."""
+    loop = asyncio.get_running_loop()
+    timer.start("connect")
+    sock = await _connect(loop, addresses, deadline.remaining())
+    timer.start("handshake")
+    try:
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(sock=sock, ssl=context, server_hostname=host), deadline.remaining())
+    except BaseException:
+        sock.close()
+        raise
+    try:
+        der = writer.get_extra_info('ssl_object').getpeercert(binary_form=True)
+        cert = writer.get_extra_info('peercert') # Decoded during the handshake; gone once the writer closes
+        timer.stop()
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, ssl.SSLError):
+            pass # The certificate is all we needed
+    timer.start("parse")
+    fingerprint, fields = lookup_certificate(der, lambda: cert)
+    result = certificate_record(domain_name, fields, fingerprint)
+    timer.stop()
+    return result
+
+
+async def _run_attempts(domain_name, attempt_function, timeout=None):
+    """
+    checks.run_attempts on the event loop: awaits `attempt_function(timer,
+    deadline)` with retries and backoff. `timeout` fixes the budget of each
+    attempt instead of taking it from the shared check policy.
+    """
+    attempt = 0
+    while True:
+        timer = PhaseTimer()
+        try:
+            result = await attempt_function(timer, Deadline(timeout or attempt_timeout(attempt)))
+            break
+        except Exception as e:
+            timer.stop()
+            if isinstance(e, asyncio.TimeoutError):
+                e = socket.timeout("timed out")
+            if not should_retry(e, attempt):
+                result = error_result(domain_name, e, timer.phase)
+                break
+        await asyncio.sleep(retry_delay(attempt))
+        attempt += 1
+    result["timings"] = result.timings or timer.timings
+    if attempt:
+        result["attempts"] = attempt + 1
+    return result
+
+
+async def probe(domain_name, context=None, timeout=None):
+    """
+    Fetches a domain's SSL certificate on the running event loop.
+    Returns the same result dict as check_ssl_status, phase timings included.
+    Every probe does a full handshake, so the certificate is the one served now.
+    """
+    loop = asyncio.get_running_loop()
+    context = context or get_tls_context()
+
+    async def _check_once(timer, deadline):
+        host, port = split_target(domain_name)
+        timer.start("resolve")
+        addresses = await asyncio.wait_for(_resolve(loop, host, port), deadline.remaining())
+        timer.stop()
+        if checks_all_addresses() and len(addresses) > 1:
+            results = await asyncio.gather(*[
+                _run_attempts(domain_name, lambda timer, deadline, address=address: _probe(
+                    domain_name, host, [address], context, timer, deadline), timeout)
+                for address in addresses])
+            result = merge_backends(domain_name, addresses, results)
+            result.timings = dict(result.timings or {}, resolve=timer.timings["resolve"])
+            return result
+        return await _probe(domain_name, host, addresses, context, timer, deadline)
+
+    result = await _run_attempts(domain_name, _check_once, timeout)
+    observe_latency(result)
+    return result
+
+
+async def _attempt(loop, address, timeout):
+    family, socktype, proto, _, sockaddr = address
+    sock = socket.socket(family, socktype, proto)
+    sock.setblocking(False)
+    try:
+        await asyncio.wait_for(loop.sock_connect(sock, sockaddr), timeout)
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def _connect(loop, addresses, timeout, delay=HAPPY_EYEBALLS_DELAY):
+    """
+    Connects a non-blocking socket Happy Eyeballs style, like the threaded
+    engine: attempts alternate address families and start `delay` apart, or
+    as soon as the previous one fails, and the first to connect wins.
+    """
+    addresses = interleave_families(addresses)
+    if not addresses:
+        raise OSError("No addresses to connect to")
+    deadline = loop.time() + timeout
+    pending = set()
+    error = None
+    try:
+        while addresses or pending:
+            if addresses:
+                pending.add(loop.create_task(_attempt(loop, addresses.pop(0), max(deadline - loop.time(), 0))))
+            wait = delay if addresses else None
+            done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel() # A cancelled attempt closes its socket
+        for task in pending:
+            if task.done() and not task.cancelled() and task.exception() is None:
+                task.result().close() # Connected while losing the race
+
+
+class AsyncCheckPool(BasePool):
+    """
+    Runs probes on an asyncio event loop in a background thread. Has the same
+    submit/feed/cancel interface as workers.CheckPool so the GUI and batch
+    runs can use either engine.
+    """
+    def __init__(self, result_queue, concurrency=DEFAULT_ASYNC_CONCURRENCY, host_interval=DEFAULT_HOST_INTERVAL,
+                 ip_interval=DEFAULT_IP_INTERVAL, timeout=None, context=None, cache=None):
+        super().__init__()
+        self.result_queue = result_queue
+        self.cache = cache
+        self._results = cache.wrap_queue(result_queue) if cache else result_queue
+        self.concurrency = max(1, concurrency)
+        self.host_limiter = RateLimiter(host_interval)
+        self.ip_limiter = RateLimiter(ip_interval)
+        self.timeout = timeout # Fixed seconds per attempt; None follows the shared check policy
+        self.context = context or get_tls_context()
+
+        # --- State ---
+        self.loop = asyncio.new_event_loop()
+        self._slots = None
+        self._waiting = threading.Semaphore(self.concurrency) # Fed domains handed to the loop that hold no slot yet
+        self._tasks = set()
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+
+    def start(self):
+        ready = threading.Event()
+        self.loop.call_soon(ready.set)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def submit(self, domain, waiting=None):
+        """Schedules a single domain on the event loop. `waiting`, if given, is released once it holds a slot."""
+        if self.cancel_event.is_set():
+            return False
+        with self._lock:
+            self.submitted += 1
+        asyncio.run_coroutine_threadsafe(self._acquire_and_check(domain, waiting), self.loop)
+        return True
+
+    def _feed_one(self, domain):
+        """
+        Hands a fed domain to the loop once fewer than `concurrency` are
+        waiting for a slot, so a batch keeps every slot busy while reading
+        happens off the loop.
+        """
+        while not self._waiting.acquire(timeout=0.2):
+            if self.cancel_event.is_set():
+                return False
+        return self.submit(domain, self._waiting)
+
+    def cancel(self):
+        """Stops feeding and cancels every probe still in flight."""
+        self.cancel_event.set()
+
+        def _cancel_all():
+            for task in list(self._tasks):
+                task.cancel()
+        self.loop.call_soon_threadsafe(_cancel_all)
+
+    def join(self, timeout=None):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout)
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.set_default_executor(concurrent.futures.ThreadPoolExecutor(RESOLVE_THREADS))
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self.loop.run_forever()
+
+    async def _acquire_and_check(self, domain, waiting=None):
+        await self._slots.acquire()
+        if waiting is not None:
+            waiting.release()
+        self._track(self._check(domain))
+
+    def _track(self, coro):
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _check(self, domain):
+        # The caller has already acquired a concurrency slot for us.
+        try:
+            cached = self.cache.get(domain) if self.cache else None
+            if cached is not None:
+                self.result_queue.put(cached)
+                return
+            host, port = split_target(domain)
+            delay = self.host_limiter.reserve(host)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.ip_limiter.interval > 0:
+                delay = self.ip_limiter.reserve(await _first_address(self.loop, host, port))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            result = await probe(domain, self.context, self.timeout)
+            self._results.put(result)
+        except ValueError as e:
+            self.result_queue.put(error_result(domain, e))
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.completed += 1
@@ -0,0 +1,59 @@
+"""
+Compares the throughput of the thread pool and asyncio check engines
+against a local TLS stand-in server.
+
+    python benchmarks/bench_engines.py -n 5000
+"""
+import argparse
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_probe import AsyncCheckPool
+from checks import check_ssl_status, configure_tls
+from workers import CheckPool
+from tls_standin import StandinServer
+
+
+def run_engine(pool, count, target):
+    result_queue = pool.result_queue
+    start = time.perf_counter()
+    pool.start()
+    pool.feed(target for _ in range(count))
+    received = errors = 0
+    while received < count:
+        result = result_queue.get()
+        received += 1
+        if result["status"] == "ERROR":
+            errors += 1
+    elapsed = time.perf_counter() - start
+    pool.cancel()
+    return elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=2000, help="Checks per engine (default: 2000).")
+    parser.add_argument("--threads", type=int, default=64, help="Thread pool size (default: 64).")
+    parser.add_argument("--async-concurrency", type=int, default=1000, help="Async handshakes in flight (default: 1000).")
+    args = parser.parse_args()
+
+    with StandinServer() as server:
+        configure_tls(cafile=server.ca_path)
+        engines = {
+            f"threads ({args.threads})": CheckPool(
+                check_ssl_status, queue.Queue(), concurrency=args.threads, host_interval=0),
+            f"async ({args.async_concurrency})": AsyncCheckPool(
+                queue.Queue(), concurrency=args.async_concurrency, host_interval=0),
+        }
+        print(f"{'engine':<20} {'checks':>8} {'errors':>8} {'seconds':>9} {'checks/s':>10}")
+        for name, pool in engines.items():
+            elapsed, errors = run_engine(pool, args.count, server.target)
+            print(f"{name:<20} {args.count:>8} {errors:>8} {elapsed:>9.2f} {args.count / elapsed:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Measures the memory held by a large batch of results, comparing the old
+result dicts with CertRecord. Each layout is built in a fresh child process
+from synthetic getpeercert() output, so the RSS figures are its own.
+
+    python benchmarks/bench_records.py -n 1000000
+"""
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ISSUERS = ["Let's Encrypt", "DigiCert Inc", "Sectigo Limited", "Google Trust Services", "Amazon", "GlobalSign nv-sa"]
+
+
+def synthetic_cert(i, rng):
+    """A certificate as getpeercert() decodes it; every string is a fresh object, as from the ssl module."""
+    issued = time.time() - rng.randint(0, 300) * 86400
+    expires = issued + rng.choice([90, 365, 397]) * 86400
+    return {
+        'subject': ((('commonName', f"host{i}.example.com"),),),
+        'issuer': ((('organizationName', "".join(rng.choice(ISSUERS))),), (('commonName', f"R{i % 4}"),)),
+        'notBefore': time.strftime('%b %d %H:%M:%S %Y GMT', time.gmtime(issued)),
+        'notAfter': time.strftime('%b %d %H:%M:%S %Y GMT', time.gmtime(expires)),
+    }
+
+
+def parse_as_dict(domain_name, cert):
+    """parse_certificate() as it was before results became CertRecords."""
+    exp_date = datetime.strptime(cert['notAfter'], '%b %d %H:%M:%S %Y %Z').replace(tzinfo=timezone.utc)
+    issue_date = datetime.strptime(cert['notBefore'], '%b %d %H:%M:%S %Y %Z')
+    issuer_dict = dict(x[0] for x in cert['issuer'])
+    subject_dict = dict(x[0] for x in cert['subject'])
+    days_left = (exp_date - datetime.now(timezone.utc)).days
+    from checks import classify
+    status = classify(days_left)
+    return {
+        "domain": domain_name,
+        "subject_cn": subject_dict.get('commonName', 'N/A'),
+        "issuer_cn": issuer_dict.get('organizationName', issuer_dict.get('commonName', 'N/A')),
+        "issued_on": issue_date.strftime('%Y-%m-%d'),
+        "expires_on": exp_date.strftime('%Y-%m-%d'),
+        "days_left": days_left,
+        "status": status,
+        "message": f"Status: {status}",
+    }
+
+
+def measure(layout, count):
+    """Builds `count` results in `layout` and returns (RSS growth in MB, seconds)."""
+    from checks import parse_certificate
+    parse = parse_as_dict if layout == "dict" else parse_certificate
+    rng = random.Random(1)
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    results = [parse(f"host{i}.example.com", synthetic_cert(i, rng)) for i in range(count)]
+    elapsed = time.perf_counter() - start
+    grown = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    if sys.platform == "darwin":
+        grown //= 1024 # ru_maxrss is in bytes there, KiB elsewhere
+    assert len(results) == count
+    return grown / 1024, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--count", type=int, default=1000000, help="Synthetic results (default: 1000000).")
+    parser.add_argument("--child", choices=["dict", "record"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        grown, elapsed = measure(args.child, args.count)
+        print(f"{grown:.1f} {elapsed:.2f}")
+        return
+
+    print(f"{'layout':<10} {'results':>9} {'RSS MB':>9} {'bytes/result':>13} {'seconds':>9}")
+    for layout in ("dict", "record"):
+        output = subprocess.run([sys.executable, __file__, "--child", layout, "-n", str(args.count)],
+                                check=True, capture_output=True, text=True).stdout.split()
+        grown, elapsed = float(output[0]), float(output[1])
+        print(f"{layout:<10} {args.count:>9} {grown:>9.1f} {grown * 1024 * 1024 / args.count:>13.0f} {elapsed:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Measures startup cost with `python -X importtime`: the time spent importing
+modules for each way sslwatch2 is started, and which heavy optional modules
+each one loads. Every run is a fresh interpreter; medians are reported.
+
+    python benchmarks/bench_startup.py -n 20 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# What each entry point imports before it starts checking
+SCENARIOS = {
+    "library": "import checks",
+    "scan": "import sslwatch2, headless; sslwatch2.parse_args(['scan', '-f', '-'])",
+    "monitor": "import sslwatch2, monitor; sslwatch2.parse_args(['monitor', '-f', '-'])",
+    "tui": "import sslwatch2, curses, gui, whois_cache; sslwatch2.parse_args([])",
+}
+# Modules that should only load on the paths that use them
+HEAVY_MODULES = ["whois", "curses", "gui", "sqlite3", "dns", "argparse", "asyncio"]
+
+
+def measure(code):
+    """Runs `code` in a fresh interpreter. Returns (import µs, wall seconds, top-level modules imported)."""
+    start = time.perf_counter()
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stderr
+    wall = time.perf_counter() - start
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        total += int(self_us)
+        modules.add(name.strip().split(".")[0])
+    return total, wall, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-n", "--runs", type=int, default=10, help="Interpreter starts per scenario (default: 10).")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="Comma-separated scenarios to run (default: all).")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON, for tracking regressions.")
+    args = parser.parse_args()
+
+    reports = []
+    print(f"{'scenario':<10} {'imports ms':>11} {'wall ms':>8}  heavy modules loaded")
+    for name in args.scenarios.split(","):
+        runs = [measure(SCENARIOS[name]) for _ in range(args.runs)]
+        imports_ms = statistics.median(total for total, _, _ in runs) / 1000
+        wall_ms = statistics.median(wall for _, wall, _ in runs) * 1000
+        heavy = [module for module in HEAVY_MODULES if module in runs[0][2]]
+        reports.append({"scenario": name, "imports_ms": round(imports_ms, 1), "wall_ms": round(wall_ms, 1),
+                        "heavy_modules": heavy})
+        print(f"{name:<10} {imports_ms:>11.1f} {wall_ms:>8.1f}  {', '.join(heavy) or '-'}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"timestamp": time.time(), "python": sys.version.split()[0], "runs": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Offline benchmark harness for the check engines.
+
+Starts a fleet of local TLS stand-in servers (CA-signed and self-signed
+certificates with varied expiry, one of them already expired, plus servers
+that add latency, drop or stall connections) and drives each engine at
+several batch sizes. Each run happens in a fresh child process so peak RSS,
+thread and fd counts are its own.
+
+    python benchmarks/run.py --sizes 1000,10000,50000 --json results.json
+"""
+import argparse
+import json
+import os
+import queue
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from tls_standin import ServerSpec, StandinFleet
+
+DEFAULT_SIZES = "1000,10000,50000"
+DEFAULT_TIMEOUT = 2.0
+
+
+def default_fleet():
+    return [ServerSpec(days=days) for days in (-1, 5, 20, 45, 90, 365, 730)] + [
+        ServerSpec(self_signed=True),
+        ServerSpec(latency=0.05),
+        ServerSpec(drop_rate=0.2),
+        ServerSpec(stall_rate=0.05),
+    ]
+
+
+def make_threads_pool(result_queue, concurrency, timeout):
+    from checks import check_ssl_status
+    from workers import CheckPool
+    return CheckPool(check_ssl_status, result_queue, concurrency=concurrency or 64, host_interval=0)
+
+
+def make_async_pool(result_queue, concurrency, timeout):
+    from async_probe import AsyncCheckPool
+    return AsyncCheckPool(result_queue, concurrency=concurrency or 1000, host_interval=0, timeout=timeout)
+
+
+ENGINES = {'threads': make_threads_pool, 'async': make_async_pool}
+
+
+class Sampler:
+    """Samples the process's thread and fd counts in the background, keeping the peaks."""
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak_threads = 0
+        self.peak_fds = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_threads = max(self.peak_threads, threading.active_count())
+            try:
+                self.peak_fds = max(self.peak_fds, len(os.listdir('/proc/self/fd')))
+            except OSError:
+                pass # Not on Linux
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def check_latency_servers(fleet, timeout):
+    """
+    Checks each server with added latency once. They must answer OK: one
+    that times out would be measured as a stall and skew the percentiles.
+    """
+    import checks
+    checks.configure_tls(cafile=fleet.ca_path)
+    checks.configure_checks(timeout=timeout, retries=0)
+    for spec, target in zip(fleet.specs, fleet.targets):
+        if spec.latency > 0:
+            result = checks.check_certificate(target)
+            assert result.status == "OK", f"{spec!r} on {target}: {result.get('message')}"
+
+
+def run_child(engine, count, targets, cafile, timeout, concurrency):
+    """Runs one engine over `count` targets and returns its measurements."""
+    import checks
+    checks.configure_tls(cafile=cafile)
+    checks.configure_checks(timeout=timeout, retries=0) # Stalled servers should cost one timeout, as before
+
+    result_queue = queue.Queue()
+    pool = ENGINES[engine](result_queue, concurrency, timeout)
+    latencies = []
+    statuses = {}
+    with Sampler() as sampler:
+        start = time.perf_counter()
+        pool.start()
+        pool.feed(targets[i % len(targets)] for i in range(count))
+        for _ in range(count):
+            result = result_queue.get()
+            statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+            latencies.append(sum(result.get("timings", {}).values()))
+        elapsed = time.perf_counter() - start
+    pool.cancel()
+
+    latencies.sort()
+    return {
+        "engine": engine,
+        "targets": count,
+        "seconds": round(elapsed, 3),
+        "checks_per_second": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_threads": sampler.peak_threads,
+        "peak_fds": sampler.peak_fds,
+        "statuses": statuses,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"Comma-separated batch sizes (default: {DEFAULT_SIZES}).")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="Comma-separated engines to run (default: all).")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help=f"Per-check timeout (default: {DEFAULT_TIMEOUT}).")
+    parser.add_argument("-c", "--concurrency", type=int, default=None, help="Override each engine's default concurrency.")
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON, for tracking regressions.")
+    parser.add_argument("--child", nargs=2, metavar=("ENGINE", "COUNT"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        targets = os.environ["SSLWATCH2_BENCH_TARGETS"].split(",")
+        cafile = os.environ["SSLWATCH2_BENCH_CAFILE"]
+        report = run_child(args.child[0], int(args.child[1]), targets, cafile, args.timeout, args.concurrency)
+        print(json.dumps(report))
+        return
+
+    reports = []
+    with StandinFleet(default_fleet()) as fleet:
+        check_latency_servers(fleet, args.timeout)
+        env = dict(os.environ, SSLWATCH2_BENCH_TARGETS=",".join(fleet.targets), SSLWATCH2_BENCH_CAFILE=fleet.ca_path)
+        print(f"{'engine':<8} {'targets':>8} {'seconds':>8} {'checks/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'p99 ms':>8} {'RSS MB':>7} {'threads':>7} {'fds':>6}")
+        for size in [int(size) for size in args.sizes.split(",")]:
+            for engine in args.engines.split(","):
+                command = [sys.executable, os.path.abspath(__file__), "--child", engine, str(size),
+                           "--timeout", str(args.timeout)]
+                if args.concurrency:
+                    command += ["--concurrency", str(args.concurrency)]
+                output = subprocess.run(command, env=env, check=True, capture_output=True, text=True).stdout
+                report = json.loads(output.strip().splitlines()[-1])
+                reports.append(report)
+                print(f"{engine:<8} {size:>8} {report['seconds']:>8.2f} {report['checks_per_second']:>9.1f} "
+                      f"{report['p50_ms']:>8.1f} {report['p95_ms']:>8.1f} {report['p99_ms']:>8.1f} "
+                      f"{report['peak_rss_mb']:>7.1f} {report['peak_threads']:>7} {report['peak_fds']:>6}",
+                      flush=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"timestamp": time.time(), "python": sys.version.split()[0], "runs": reports}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
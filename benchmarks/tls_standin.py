@@ -0,0 +1,150 @@
+"""
+Local TLS stand-in servers for benchmarking the check engines offline.
+
+Servers run in a separate process so their CPU time does not count against
+the engine being measured. Certificates are generated with the openssl CLI:
+a local CA signs the leaf certificates, and self-signed leaves can be mixed
+in to exercise the verification error path.
+"""
+import asyncio
+import multiprocessing
+import os
+import random
+import ssl
+import subprocess
+import tempfile
+
+SUBJECT_ALT_NAME = "subjectAltName=DNS:localhost,IP:127.0.0.1"
+
+
+def _openssl(*args):
+    subprocess.run(["openssl", *args], check=True, capture_output=True)
+
+
+def make_ca(directory):
+    """Generates a local CA certificate and key, returning their paths."""
+    cert_path = os.path.join(directory, "ca.crt")
+    key_path = os.path.join(directory, "ca.key")
+    _openssl("req", "-x509", "-nodes", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+             "-keyout", key_path, "-out", cert_path, "-days", "3650",
+             "-subj", "/O=SSLWatch2 Bench/CN=SSLWatch2 Bench CA")
+    return cert_path, key_path
+
+
+def make_certificate(directory, name, days=90, ca=None):
+    """
+    Generates a certificate for localhost valid for `days`, signed by `ca`
+    (a (cert, key) pair) or self-signed. Returns the (cert, key) paths.
+    `days` of -1 gives a certificate that expired a day ago: 'openssl x509
+    -req' accepts it where 'openssl req -x509' does not, but goes no lower.
+    """
+    cert_path = os.path.join(directory, f"{name}.crt")
+    key_path = os.path.join(directory, f"{name}.key")
+    csr_path = os.path.join(directory, f"{name}.csr")
+    ext_path = os.path.join(directory, f"{name}.ext")
+    with open(ext_path, 'w') as f:
+        f.write(SUBJECT_ALT_NAME + "\n")
+    _openssl("req", "-new", "-nodes", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1",
+             "-keyout", key_path, "-out", csr_path, "-subj", "/O=SSLWatch2 Bench/CN=localhost")
+    signer = ["-signkey", key_path] if ca is None else ["-CA", ca[0], "-CAkey", ca[1], "-CAcreateserial"]
+    _openssl("x509", "-req", "-in", csr_path, *signer, "-out", cert_path, "-days", str(days), "-extfile", ext_path)
+    return cert_path, key_path
+
+
+class ServerSpec:
+    """
+    How one stand-in server behaves.
+
+    latency      -- seconds to wait after accepting before the TLS handshake
+    drop_rate    -- fraction of connections closed without a handshake
+    stall_rate   -- fraction of connections held open without ever handshaking
+                    (slow-loris style), for `stall_seconds`
+    self_signed  -- serve a self-signed certificate instead of a CA-signed one
+    days         -- certificate validity in days; -1 for one that has already expired
+    """
+    def __init__(self, days=90, latency=0.0, drop_rate=0.0, stall_rate=0.0, stall_seconds=30.0, self_signed=False):
+        self.days = days
+        self.latency = latency
+        self.drop_rate = drop_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.self_signed = self_signed
+        self.cert_path = None
+        self.key_path = None
+
+    def __repr__(self):
+        return (f"ServerSpec(days={self.days}, latency={self.latency}, drop_rate={self.drop_rate}, "
+                f"stall_rate={self.stall_rate}, self_signed={self.self_signed})")
+
+
+def _serve(specs, port_queue):
+    async def serve_one(spec):
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(spec.cert_path, spec.key_path)
+
+        async def handle(reader, writer):
+            # Leave the ClientHello in the socket until start_tls(); read into the stream now, it would be lost
+            writer.transport.pause_reading()
+            try:
+                roll = random.random()
+                if roll < spec.drop_rate:
+                    return
+                if roll < spec.drop_rate + spec.stall_rate:
+                    await asyncio.sleep(spec.stall_seconds)
+                    return
+                if spec.latency:
+                    await asyncio.sleep(spec.latency)
+                await writer.start_tls(context)
+            except (OSError, ssl.SSLError, asyncio.TimeoutError):
+                pass # Clients hang up as they please
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=4096)
+        return server, server.sockets[0].getsockname()[1]
+
+    async def main():
+        servers = [await serve_one(spec) for spec in specs]
+        port_queue.put([port for _, port in servers])
+        await asyncio.gather(*(server.serve_forever() for server, _ in servers))
+
+    asyncio.run(main())
+
+
+class StandinFleet:
+    """Context manager running one local TLS server per ServerSpec."""
+    def __init__(self, specs):
+        self.specs = specs
+        self._tmpdir = tempfile.TemporaryDirectory()
+        self.ca_path, ca_key = make_ca(self._tmpdir.name)
+        for i, spec in enumerate(specs):
+            ca = None if spec.self_signed else (self.ca_path, ca_key)
+            spec.cert_path, spec.key_path = make_certificate(self._tmpdir.name, f"server{i}", spec.days, ca)
+        self.ports = []
+        self._process = None
+
+    def __enter__(self):
+        port_queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(target=_serve, args=(self.specs, port_queue), daemon=True)
+        self._process.start()
+        self.ports = port_queue.get(timeout=30)
+        return self
+
+    def __exit__(self, *exc_info):
+        self._process.terminate()
+        self._process.join()
+        self._tmpdir.cleanup()
+
+    @property
+    def targets(self):
+        return [f"localhost:{port}" for port in self.ports]
+
+
+class StandinServer(StandinFleet):
+    """A fleet of a single well-behaved server."""
+    def __init__(self, days=90):
+        super().__init__([ServerSpec(days=days)])
+
+    @property
+    def target(self):
+        return self.targets[0]
@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+
+from records import CertRecord
+from targets import split_target
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sslwatch2", "results.sqlite")
+COMMIT_EVERY = 200 # Writes batched per transaction
+
+# (minimum days_left, seconds a result stays fresh), checked in order.
+TTL_POLICY = [
+    (180, 7 * 86400),
+    (60, 86400),
+    (30, 6 * 3600),
+    (10, 3600),
+    (0, 900),
+]
+EXPIRED_TTL = 900
+
+
+def ttl_for(result):
+    """Seconds a result may be served from the cache. Errors are never cached."""
+    days_left = result.get("days_left")
+    if result.get("status") == "ERROR" or not isinstance(days_left, int):
+        return 0
+    for min_days, ttl in TTL_POLICY:
+        if days_left >= min_days:
+            return ttl
+    return EXPIRED_TTL
+
+
+def cache_key(target):
+    host, port = split_target(target)
+    return f"{host.lower()}:{port}"
+
+
+class ResultCache:
+    """
+    An on-disk SQLite cache of check results keyed by host:port. Entries live
+    for ttl_for(result) seconds, so certificates far from expiry are re-probed
+    rarely and nearly expired ones often.
+    """
+    def __init__(self, path=DEFAULT_CACHE_PATH, refresh=False, classify=None):
+        self.path = path
+        self.refresh = refresh # Ignore stored entries but still record new results
+        self.classify = classify
+        self.hits = 0
+        self.misses = 0
+        self._pending_writes = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        import sqlite3 # Loaded only when a cache is opened; sslwatch2 imports this module for its default path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " key TEXT PRIMARY KEY, result TEXT NOT NULL,"
+            " checked_at REAL NOT NULL, fresh_until REAL NOT NULL)")
+        self._conn.commit()
+
+    def get(self, target):
+        """Returns the cached result for `target`, or None on a miss."""
+        if self.refresh:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            key = cache_key(target)
+        except ValueError:
+            return None
+        with self._lock:
+            if self._closed:
+                return None
+            row = self._conn.execute(
+                "SELECT result, checked_at FROM results WHERE key = ? AND fresh_until > ?",
+                (key, time.time())).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        result = CertRecord.from_dict(json.loads(row[0]))
+        result.domain = target
+        result.cached = True
+        result.timings = None # No network work was done for this result
+        # Age days_left by the whole days elapsed since the handshake.
+        elapsed_days = int((time.time() - row[1]) // 86400)
+        if elapsed_days and isinstance(result.days_left, int):
+            result.days_left -= elapsed_days
+            if self.classify:
+                result.status = self.classify(result.days_left)
+        return result
+
+    def put(self, target, result):
+        ttl = ttl_for(result)
+        if ttl <= 0:
+            return
+        try:
+            key = cache_key(target)
+        except ValueError:
+            return
+        now = time.time()
+        with self._lock:
+            if self._closed:
+                return # A check abandoned at the deadline or on Ctrl-C finished after close()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, result, checked_at, fresh_until) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(result.to_dict()), now, now + ttl))
+            self._pending_writes += 1
+            if self._pending_writes >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending_writes = 0
+
+    def wrap_queue(self, result_queue):
+        """Returns a queue-like object that caches results on their way to `result_queue`."""
+        return _CachingQueue(self, result_queue)
+
+    def stats(self):
+        return f"Cache: {self.hits} hits, {self.misses} misses"
+
+    def close(self):
+        """Commits and closes the database. Later get() and put() calls do nothing."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._conn.commit()
+            self._conn.close()
+
+
+class _CachingQueue:
+    def __init__(self, cache, result_queue):
+        self.cache = cache
+        self.result_queue = result_queue
+
+    def put(self, result):
+        if "domain" in result:
+            self.cache.put(result["domain"], result)
+        self.result_queue.put(result)
@@ -0,0 +1,58 @@
+import collections
+import os
+import threading
+
+
+class ResultChannel:
+    """
+    A thread-safe result queue that can wake a selector. The first put() into
+    an empty channel writes a byte to a self-pipe whose read end is exposed
+    through fileno(), so a UI loop can wait on it next to stdin instead of
+    polling. Workers only need put(), like with queue.Queue.
+    """
+    def __init__(self):
+        self._items = collections.deque()
+        self._lock = threading.Lock()
+        self._read_fd, self._write_fd = os.pipe()
+        os.set_blocking(self._read_fd, False)
+        os.set_blocking(self._write_fd, False)
+        self._signalled = False
+
+    def fileno(self):
+        return self._read_fd
+
+    def put(self, item):
+        with self._lock:
+            self._items.append(item)
+            if self._signalled:
+                return
+            self._signalled = True
+            try:
+                os.write(self._write_fd, b'\0')
+            except BlockingIOError:
+                pass # The pipe is already readable
+
+    def drain(self, limit=None):
+        """
+        Removes and returns up to `limit` items in arrival order. The wakeup
+        is cleared only once the channel is empty, so leftovers wake the
+        selector again straight away.
+        """
+        with self._lock:
+            count = len(self._items) if limit is None else min(limit, len(self._items))
+            items = [self._items.popleft() for _ in range(count)]
+            if not self._items and self._signalled:
+                self._signalled = False
+                try:
+                    while os.read(self._read_fd, 4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            return items
+
+    def __len__(self):
+        return len(self._items)
+
+    def close(self):
+        os.close(self._read_fd)
+        os.close(self._write_fd)
@@ -0,0 +1,471 @@
+"""
+The certificate check engine: the TLS, DNS and retry settings shared by
+every check, and the checks themselves. It has no command line, so it can
+be imported as a library without loading the interface or the engines.
+"""
+import errno
+import functools
+import hashlib
+import os
+import random
+import selectors
+import ssl
+import socket
+import threading
+import time
+import queue
+
+from metrics import AdaptiveTimeout
+from records import CertRecord, CertificateMemo
+from resolver import DNS_TTL, Resolver, interleave_families
+from store import STATUS_ORDER
+from targets import DEFAULT_PORT, split_target
+
+DEFAULT_TIMEOUT = 5 # Seconds each check attempt may spend resolving, connecting and handshaking
+DEFAULT_RETRIES = 1 # Extra attempts for a check that failed in a way that may be transient
+RETRY_BACKOFF = 0.5 # Base seconds of the jittered exponential backoff between attempts
+MAX_BACKOFF = 5.0
+HAPPY_EYEBALLS_DELAY = 0.25 # Seconds before racing the next address while a connect is pending (RFC 8305)
+
+# --- Shared TLS state ---
+_tls_lock = threading.Lock()
+_tls_context = None
+_cert_memo = CertificateMemo() # Parsed fields of certificates seen before, by fingerprint
+
+# --- Shared DNS state ---
+_resolver = Resolver()
+_all_addresses = False # Check every address of a host rather than the first to connect
+
+# --- Shared check policy ---
+_check_timeout = DEFAULT_TIMEOUT
+_adaptive_timeout = None # AdaptiveTimeout when --adaptive-timeout is on
+_retries = DEFAULT_RETRIES
+
+def configure_tls(cafile=None, capath=None):
+    """
+    Builds the SSLContext shared by every check. Loading the CA store is
+    expensive, so it happens once here rather than per domain. Passing
+    `cafile`/`capath` replaces the system CA store, e.g. with a test CA.
+    """
+    global _tls_context
+    context = ssl.create_default_context(cafile=cafile, capath=capath)
+    with _tls_lock:
+        _tls_context = context
+    return context
+
+def configure_dns(ttl=DNS_TTL, all_addresses=False):
+    """
+    Replaces the shared address cache. `ttl` applies where the record's own
+    TTL is unknown; with `all_addresses` every check probes each A/AAAA
+    address of its host and reports them all.
+    """
+    global _resolver, _all_addresses
+    _resolver = Resolver(ttl=ttl)
+    _all_addresses = all_addresses
+    return _resolver
+
+def configure_checks(timeout=DEFAULT_TIMEOUT, adaptive=False, retries=DEFAULT_RETRIES):
+    """
+    Sets the time budget of each check attempt and how often failed checks
+    are retried. With `adaptive` the budget follows the latency observed in
+    this run, with `timeout` as its ceiling.
+    """
+    global _check_timeout, _adaptive_timeout, _retries
+    _check_timeout = timeout
+    _adaptive_timeout = AdaptiveTimeout(timeout) if adaptive else None
+    _retries = max(0, retries)
+
+def configure(args):
+    """
+    Applies the check options parsed by sslwatch2.parse_args() (--cafile,
+    --capath, --dns-ttl, --all-addresses, --timeout, --adaptive-timeout and
+    --retries). Returns the checker functions by kind, as the pools and
+    interfaces take them.
+    """
+    configure_tls(args.cafile, args.capath)
+    configure_dns(args.dns_ttl, args.all_addresses)
+    configure_checks(args.timeout, args.adaptive_timeout, args.retries)
+    return {'ssl': check_ssl_status, 'whois': get_whois_info}
+
+def attempt_timeout(attempt):
+    """
+    The budget for a check's attempt number `attempt`, counting from 0. An
+    adaptive budget doubles on each retry, so a slow host is not cut off
+    just for being slower than the rest.
+    """
+    if _adaptive_timeout is None:
+        return _check_timeout
+    return min(_check_timeout, _adaptive_timeout.timeout() * 2 ** attempt)
+
+def retry_delay(attempt):
+    """Seconds to wait before retrying after attempt number `attempt`: exponential backoff with full jitter."""
+    return random.uniform(0, min(MAX_BACKOFF, RETRY_BACKOFF * 2 ** attempt))
+
+def should_retry(error, attempt):
+    """
+    True if a check that raised `error` on attempt number `attempt` should be
+    tried again. Only failures that may clear up on their own are retried:
+    timeouts, resets, unreachable networks and temporary DNS failures. A bad
+    certificate, a refused port or a name that does not exist is final.
+    """
+    if attempt >= _retries:
+        return False
+    if isinstance(error, socket.gaierror):
+        return error.errno == socket.EAI_AGAIN
+    if isinstance(error, ssl.SSLCertVerificationError):
+        return False
+    if isinstance(error, (ssl.SSLEOFError, ssl.SSLZeroReturnError)):
+        return True # The server hung up during the handshake
+    if isinstance(error, ssl.SSLError):
+        return False
+    if isinstance(error, (socket.timeout, ConnectionResetError, ConnectionAbortedError)):
+        return True
+    return isinstance(error, OSError) and error.errno in (errno.ENETUNREACH, errno.EHOSTUNREACH)
+
+def observe_latency(result):
+    """Feeds a finished check into the adaptive timeout, if one is in use."""
+    timings = result.get("timings")
+    if _adaptive_timeout is None or result.get("status") == "ERROR" or not timings or result.get("cached"):
+        return
+    _adaptive_timeout.observe(sum(timings.get(phase, 0) for phase in ("resolve", "connect", "handshake")))
+
+def get_resolver():
+    """Returns the shared Resolver, e.g. to prefetch the addresses of queued targets."""
+    return _resolver
+
+def checks_all_addresses():
+    """True when checks probe every address of a host (--all-addresses)."""
+    return _all_addresses
+
+def prefetch_addresses(targets):
+    """Resolves `targets` in the background ahead of their checks."""
+    _resolver.prefetch(targets)
+
+def get_tls_context():
+    """Returns the shared SSLContext, creating it with the system CA store on first use."""
+    global _tls_context
+    if _tls_context is None:
+        with _tls_lock:
+            if _tls_context is None:
+                _tls_context = ssl.create_default_context()
+    return _tls_context
+
+def classify(days_left):
+    """Maps the number of days until expiry to a status string."""
+    if days_left < 0:
+        return "EXPIRED"
+    elif days_left <= 10:
+        return "ALERT"
+    elif days_left <= 30:
+        return "WARNING"
+    return "OK"
+
+def _certificate_fields(cert):
+    """Extracts (subject_cn, issuer_cn, issued_at, expires_at) from the decoded certificate returned by getpeercert()."""
+    # Validity dates as epoch seconds; they are only formatted for display
+    expires_at = ssl.cert_time_to_seconds(cert['notAfter'])
+    issued_at = ssl.cert_time_to_seconds(cert['notBefore'])
+
+    # Get issuer and subject details
+    issuer_dict = dict(x[0] for x in cert['issuer'])
+    subject_dict = dict(x[0] for x in cert['subject'])
+
+    return (subject_dict.get('commonName', 'N/A'),
+            issuer_dict.get('organizationName', issuer_dict.get('commonName', 'N/A')),
+            issued_at, expires_at)
+
+def lookup_certificate(der, decode):
+    """
+    Returns (fingerprint, fields) for a DER certificate. Fields are memoized by
+    SHA-256 fingerprint, so `decode`, which returns getpeercert() output, is
+    only called for certificates not seen before.
+    """
+    fingerprint = hashlib.sha256(der).hexdigest()
+    fields = _cert_memo.get(fingerprint)
+    if fields is None:
+        fields = _certificate_fields(decode())
+        _cert_memo.put(fingerprint, fields)
+    return fingerprint, fields
+
+def certificate_record(domain_name, fields, fingerprint=None):
+    """Builds a result record from certificate fields; only days_left and the status depend on the host."""
+    subject_cn, issuer_cn, issued_at, expires_at = fields
+    days_left = int((expires_at - time.time()) // 86400)
+    return CertRecord(domain_name, classify(days_left), subject_cn=subject_cn, issuer_cn=issuer_cn,
+                      issued_at=issued_at, expires_at=expires_at, days_left=days_left, fingerprint=fingerprint)
+
+def parse_certificate(domain_name, cert):
+    """Builds a result record from the decoded certificate returned by getpeercert()."""
+    return certificate_record(domain_name, _certificate_fields(cert))
+
+def error_result(domain_name, error, phase=None):
+    """
+    Builds the ERROR result for an exception raised while checking a domain.
+    `phase` is the check phase that was running, so timeouts can be attributed.
+    """
+    try:
+        host, port = split_target(domain_name)
+    except ValueError:
+        host, port = domain_name, DEFAULT_PORT
+    if isinstance(error, socket.gaierror):
+        message = f"Could not resolve hostname: '{host}'."
+    elif isinstance(error, socket.timeout):
+        message = {
+            "resolve": f"Timed out resolving hostname: '{host}'.",
+            "connect": f"Timed out connecting to '{host}' on port {port}.",
+            "handshake": f"Timed out during the TLS handshake with '{host}'.",
+        }.get(phase, f"Timed out checking '{host}' on port {port}.")
+    elif isinstance(error, ssl.SSLCertVerificationError):
+        message = f"SSL verification error for '{host}': {error.reason}"
+    elif isinstance(error, (ValueError, KeyError)) and phase == "parse":
+        message = f"Could not parse certificate for '{host}'."
+    elif isinstance(error, ValueError) and phase is None:
+        message = f"Invalid target: '{domain_name}'."
+    elif isinstance(error, OSError) and phase == "connect":
+        message = f"Could not connect to '{host}' on port {port}."
+    elif isinstance(error, OSError) and phase == "handshake":
+        message = f"TLS handshake with '{host}' failed: {error}"
+    else:
+        message = f"An unexpected error occurred: {error}"
+    result = CertRecord(domain_name, "ERROR", message=message)
+    result.failed_phase = phase
+    return result
+
+class Deadline:
+    """The time budget shared by the phases of one check attempt."""
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        """Seconds left of the budget. Raises socket.timeout once it is spent."""
+        left = self.expires - time.monotonic()
+        if left <= 0:
+            raise socket.timeout("timed out")
+        return left
+
+class PhaseTimer:
+    """Records how long each phase of a check takes, and which phase is running."""
+    def __init__(self):
+        self.timings = {}
+        self.phase = None
+        self._started = None
+
+    def start(self, phase):
+        self.stop()
+        self.phase = phase
+        self._started = time.perf_counter()
+
+    def stop(self):
+        """Ends the running phase. `phase` is kept so a failure can be attributed to it."""
+        if self._started is not None:
+            self.timings[self.phase] = round(time.perf_counter() - self._started, 6)
+            self._started = None
+
+def _connect(addresses, timeout, delay=HAPPY_EYEBALLS_DELAY):
+    """
+    Connects to one of the addresses from getaddrinfo() Happy Eyeballs style:
+    attempts alternate between IPv6 and IPv4 and start `delay` apart, or at
+    once when the previous one fails, and the first to connect wins.
+    `timeout` bounds the whole race.
+    """
+    addresses = interleave_families(addresses)
+    if not addresses:
+        raise OSError("No addresses to connect to")
+    deadline = time.monotonic() + timeout
+    selector = selectors.DefaultSelector()
+    pending = []
+    winner = None
+    error = None
+    next_start = 0
+    try:
+        while winner is None:
+            now = time.monotonic()
+            if addresses and (not pending or now >= next_start):
+                family, socktype, proto, _, sockaddr = addresses.pop(0)
+                try:
+                    sock = socket.socket(family, socktype, proto)
+                except OSError as e:
+                    error = e # E.g. EAFNOSUPPORT for IPv6 on a host without it: try the next address
+                    next_start = 0
+                    continue
+                sock.setblocking(False)
+                try:
+                    code = sock.connect_ex(sockaddr)
+                except OSError as e:
+                    code = e.errno or errno.EINVAL
+                if code == 0:
+                    winner = sock
+                elif code in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EALREADY):
+                    selector.register(sock, selectors.EVENT_WRITE)
+                    pending.append(sock)
+                    next_start = now + delay
+                else:
+                    sock.close()
+                    error = OSError(code, os.strerror(code))
+                    next_start = 0
+                continue
+            if not pending:
+                raise error
+            if now >= deadline:
+                raise socket.timeout("timed out")
+            wait = deadline - now
+            if addresses:
+                wait = min(wait, next_start - now)
+            for key, _ in selector.select(max(wait, 0)):
+                sock = key.fileobj
+                selector.unregister(sock)
+                pending.remove(sock)
+                code = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if code == 0:
+                    winner = sock
+                    break
+                sock.close()
+                error = OSError(code, os.strerror(code))
+                next_start = 0 # Start the next attempt now
+    finally:
+        for sock in pending:
+            sock.close()
+        selector.close()
+    winner.setblocking(True)
+    winner.settimeout(timeout)
+    return winner
+
+def _probe(domain_name, host, port, addresses, context, timer, deadline):
+    """
+    Connects to one of `addresses`, fetches the certificate and returns its
+    result record. Sessions are never resumed: an abbreviated handshake
+    sends no certificate, so the one from the earlier session would be
+    reported instead of what the server serves now.
+    """
+    timer.start("connect")
+    with _connect(addresses, deadline.remaining()) as sock:
+        timer.start("handshake")
+        sock.settimeout(deadline.remaining())
+        with context.wrap_socket(sock, server_hostname=host) as ssock:
+            der = ssock.getpeercert(binary_form=True)
+            timer.start("parse")
+            # Certificates shared by many hosts are decoded and parsed only once
+            fingerprint, fields = lookup_certificate(der, ssock.getpeercert)
+    result = certificate_record(domain_name, fields, fingerprint)
+    timer.stop()
+    return result
+
+def run_attempts(domain_name, attempt_function):
+    """
+    Runs `attempt_function(timer, deadline)` until it returns a result or
+    fails in a way should_retry() rejects, sleeping with backoff in between.
+    Failures become ERROR results. The result carries the phase timings of
+    the last attempt, and 'attempts' when there was more than one.
+    """
+    attempt = 0
+    while True:
+        timer = PhaseTimer()
+        try:
+            result = attempt_function(timer, Deadline(attempt_timeout(attempt)))
+            break
+        except Exception as e:
+            timer.stop()
+            if not should_retry(e, attempt):
+                result = error_result(domain_name, e, timer.phase)
+                break
+        time.sleep(retry_delay(attempt))
+        attempt += 1
+    result["timings"] = result.timings or timer.timings
+    if attempt:
+        result["attempts"] = attempt + 1
+    return result
+
+def _probe_address(domain_name, host, port, address, context):
+    """Checks a single address of a host, for --all-addresses."""
+    return run_attempts(domain_name, lambda timer, deadline: _probe(
+        domain_name, host, port, [address], context, timer, deadline))
+
+def merge_backends(domain_name, addresses, results):
+    """
+    Combines the per-address results of an --all-addresses check into one:
+    the most urgent result among the backends that served a certificate,
+    with every backend listed under 'backends' and 'mismatch' set when they
+    serve different certificates. Backends that failed are named in the
+    message; the result is only an ERROR when every backend failed.
+    """
+    backends = []
+    for address, result in zip(addresses, results):
+        backend = {"address": address[4][0]}
+        for key in ("status", "days_left", "expires_on", "fingerprint", "message"):
+            if key in result:
+                backend[key] = result[key]
+        backends.append(backend)
+    answered = [i for i, result in enumerate(results) if result.status != "ERROR"]
+    worst = min(answered or range(len(results)),
+                key=lambda i: (STATUS_ORDER.get(results[i].status, len(STATUS_ORDER)),
+                               results[i].days_left if results[i].days_left is not None else 0))
+    merged = results[worst]
+    if merged.status == "ERROR":
+        merged["message"] = f"{backends[worst]['address']}: {merged['message']}"
+    merged["backends"] = backends
+    fingerprints = {result.fingerprint for result in results if result.fingerprint}
+    if len(fingerprints) > 1:
+        merged["mismatch"] = True
+        merged["message"] = f"{len(fingerprints)} different certificates across {len(results)} addresses."
+    failed = [backend["address"] for backend, result in zip(backends, results) if result.status == "ERROR"]
+    if answered and failed:
+        merged["message"] = f"{merged['message'].rstrip('.')}. Failed on {', '.join(failed)}; see backends."
+    return merged
+
+def _check_all_addresses(domain_name, host, port, addresses, context):
+    """Probes every address of a host in parallel and merges the results."""
+    results = [None] * len(addresses)
+
+    def _run(i):
+        results[i] = _probe_address(domain_name, host, port, addresses[i], context)
+
+    threads = [threading.Thread(target=_run, args=(i,), daemon=True) for i in range(1, len(addresses))]
+    for thread in threads:
+        thread.start()
+    _run(0)
+    for thread in threads:
+        thread.join()
+    return merge_backends(domain_name, addresses, results)
+
+def _check_once(domain_name, timer, deadline):
+    host, port = split_target(domain_name)
+    context = get_tls_context()
+    timer.start("resolve")
+    addresses = _resolver.resolve(host, port, deadline.remaining())
+    timer.stop()
+    if _all_addresses and len(addresses) > 1:
+        result = _check_all_addresses(domain_name, host, port, addresses, context)
+        result.timings = dict(result.timings or {}, resolve=timer.timings["resolve"])
+        return result
+    return _probe(domain_name, host, port, addresses, context, timer, deadline)
+
+def check_ssl_status(domain_name, result_queue):
+    """
+    Fetches a domain's SSL certificate and determines its expiration status.
+    This method is run in a separate thread and puts the result in a queue.
+    The result carries the time spent resolving, connecting, handshaking and parsing.
+    Addresses come from the shared DNS cache; with --all-addresses each one is checked.
+    Each attempt has its own time budget, and transient failures are retried.
+    """
+    result = run_attempts(domain_name, functools.partial(_check_once, domain_name))
+    observe_latency(result)
+    result_queue.put(result)
+
+def check_certificate(domain_name):
+    """Checks one target and returns its result record, for use as a library."""
+    result_queue = queue.Queue()
+    check_ssl_status(domain_name, result_queue)
+    return result_queue.get()
+
+def get_whois_info(domain_name, result_queue):
+    """
+    Fetches whois information for a domain.
+    This method is run in a separate thread and puts the result in a queue.
+    """
+    try:
+        import whois # Heavy, and only needed once a WHOIS lookup is asked for
+        w = whois.whois(domain_name)
+        result = {"domain": domain_name, "status": "WHOIS_SUCCESS", "data": w.text}
+    except Exception as e:
+        result = {"domain": domain_name, "status": "WHOIS_ERROR", "data": f"Could not retrieve whois info for '{domain_name}':\n{e}"}
+    result_queue.put(result)
@@ -1,24 +1,62 @@
 import curses
+import os
+import selectors
+import sys
 import threading
-import queue
+import time
+
+from channels import ResultChannel
+
+from metrics import RunMetrics, Throughput
+from monitor import load_state
+from records import CertificateGroups
+from store import ResultIndex, ResultStore, SORT_KEYS
+from targets import TargetReader
+from workers import CheckPool
+
+RESULT_BATCH = 500 # Results applied per wakeup, so a flood of completions cannot stall input
+HOUSEKEEPING_INTERVAL = 1.0 # Seconds between wakeups without events while checking or attached
+FRAME_INTERVAL = 1 / 20 # Minimum seconds between repaints; changes in between are coalesced
+PROGRESS_BAR_WIDTH = 20
+REGIONS = ('chrome', 'status', 'input', 'output', 'title') # Parts of the screen repainted independently
+SORT_CYCLE = list(SORT_KEYS) # Order Ctrl-O steps through
+DETAIL_LINES = 8 # Lines per result in the detailed view
+SHARED_HOSTS_SHOWN = 3 # Other hosts named on the Cert line of the detailed view
 
 class GUI:
-    def __init__(self, stdscr, checker_functions):
+    def __init__(self, stdscr, checker_functions, pool_factory=CheckPool, attach_path=None):
         self.stdscr = stdscr
         self.checker_functions = checker_functions
         self._setup_curses()
         self._create_windows()
 
         # --- State ---
-        self.result_queue = queue.Queue()
-        self.results_list = []
+        # Separate channels so the WHOIS popup can never swallow SSL results
+        self.ssl_channel = ResultChannel()
+        self.whois_channel = ResultChannel()
+        self.main_selector = self._make_selector(self.ssl_channel, self.whois_channel)
+        self.popup_selector = self._make_selector(self.whois_channel)
+        self.input_selector = self._make_selector()
+        self.pool = pool_factory(checker_functions['ssl'], self.ssl_channel).start()
+        self.results = ResultStore()
+        self.view = ResultIndex(self.results) # What the output window shows: sorted and filtered
+        self.metrics = RunMetrics()
+        self.cert_groups = CertificateGroups() # Hosts sharing each certificate, for the detailed view
+        self.throughput = Throughput()
+        self.reader = None # TargetReader of the current file import
+        self.batch_done = 0 # Results received for the current batch
         self.active_threads = 0
         self.is_checking = False
         self.scroll_pos = 0
         self.detailed_view = False # Start with compact view
-        self.app_mode = 'DOMAIN_INPUT'
+        self.app_mode = 'ATTACHED' if attach_path else 'DOMAIN_INPUT'
+        self.filter_return_mode = None # Mode to go back to when the filter prompt closes
+        self.attach_path = attach_path # State file of a running monitor
+        self.attach_mtime = None
         self.domain_input_str = ""
         self.popup_active = False
+        self.dirty = set(REGIONS) # Regions to repaint on the next frame
+        self.last_frame = 0.0
 
     def _setup_curses(self):
         curses.mousemask(curses.ALL_MOUSE_EVENTS | curses.REPORT_MOUSE_POSITION)
@@ -43,34 +81,103 @@ class GUI:
         output_win_y = 9
         self.input_win = curses.newwin(3, 60, input_win_y, input_win_x)
         self.input_win.keypad(True)
-        self.input_win.timeout(100) # Set non-blocking on the window that gets input
-        self.stdscr.timeout(100) # Set a non-blocking timeout on the main screen
+        self.input_win.nodelay(True) # Keys are read only after the selector reports stdin readable
+        self.stdscr.nodelay(True)
         self.output_win = curses.newwin(h - output_win_y - 2, w - 4, output_win_y, 2)
 
+    def _make_selector(self, *channels):
+        selector = selectors.DefaultSelector()
+        selector.register(sys.stdin, selectors.EVENT_READ, 'input')
+        for channel in channels:
+            selector.register(channel, selectors.EVENT_READ, 'ssl' if channel is self.ssl_channel else 'whois')
+        return selector
+
+    def _page_size(self):
+        lines_per_block = DETAIL_LINES if self.detailed_view else 1
+        return max(1, (self.output_win.getmaxyx()[0] - 2) // lines_per_block)
+
+    def _invalidate(self, *regions):
+        """Marks screen regions for repainting on the next frame; no arguments means all of them."""
+        self.dirty.update(regions or REGIONS)
+
+    def _progress_text(self):
+        """Import progress for the title line: done/total with a bar once the total is known, checks/sec and ETA."""
+        done, reader = self.batch_done, self.reader
+        if reader.done:
+            total = max(reader.unique, 1)
+            filled = PROGRESS_BAR_WIDTH * min(done, total) // total
+            text = f"[{'#' * filled}{'.' * (PROGRESS_BAR_WIDTH - filled)}] {done}/{reader.unique} "
+        else:
+            text = f"{done}/{reader.unique}+ " # Still reading the file
+        rate = self.throughput.rate()
+        if rate:
+            text += f"{rate:.0f}/s "
+        eta = self.throughput.eta(reader.unique - done) if reader.done else None
+        if eta is not None:
+            text += f"ETA {int(eta) // 60}:{int(eta) % 60:02d} "
+        if reader.invalid:
+            text += f"{reader.invalid} invalid "
+        return text
+
+    def _draw_output_title(self):
+        win = self.output_win
+        w = win.getmaxyx()[1]
+        win.move(0, 1)
+        win.hline(curses.ACS_HLINE, w - 2) # Clear the previous title back to the border
+        if not len(self.results):
+            title = " Result "
+        else:
+            page_size = self._page_size()
+            total_pages = max(1, (len(self.view) + page_size - 1) // page_size)
+            current_page = min(total_pages, (self.scroll_pos // page_size) + 1)
+            title = f" Results: {len(self.view)} "
+            if self.view.query:
+                title = f" Results: {len(self.view)} of {len(self.results)} "
+            if total_pages > 1:
+                title += f"Page: {current_page}/{total_pages} "
+            if self.view.sort_key != 'arrival' or self.view.reverse:
+                title += f"Sort: {self.view.sort_key} {'desc' if self.view.reverse else 'asc'} "
+            if self.view.query:
+                title += f"Filter: {self.view.query} "
+            if self.reader and self.is_checking:
+                title += self._progress_text()
+        win.addstr(0, 2, title[:w - 4])
+        win.noutrefresh()
+
+    def _cert_line(self, result):
+        fingerprint = result['fingerprint']
+        line = f"Cert:       sha256 {fingerprint[:16]}"
+        shared = self.cert_groups.count(fingerprint)
+        if shared > 1:
+            others = [host for host in self.cert_groups.hosts(fingerprint, SHARED_HOSTS_SHOWN + 1)
+                      if host != result.get('domain')][:SHARED_HOSTS_SHOWN]
+            line += f", shared by {shared} hosts: {', '.join(others)}"
+            if shared - 1 > len(others):
+                line += ", ..."
+        backends = result.get('backends')
+        if backends:
+            line += f"; {len(backends)} addresses"
+            if result.get('mismatch'):
+                line += ", certificates differ"
+        return line
+
     def _draw_output_window(self):
         win = self.output_win
         win.erase()
         win.box()
         h, w = win.getmaxyx()
+        self._draw_output_title()
 
-        if not self.results_list:
-            win.addstr(0, 2, " Result ")
-            win.addstr(2, 2, "Enter a domain name above and press Enter.")
+        if not len(self.view):
+            empty = "No results match the filter." if len(self.results) else "Enter a domain name above and press Enter."
+            win.addstr(2, 2, empty)
             win.noutrefresh()
             return
 
-        lines_per_block = 7 if self.detailed_view else 1
-        page_size = max(1, (h - 2) // lines_per_block)
-        total_pages = max(1, (len(self.results_list) + page_size - 1) // page_size) if page_size > 0 else 1
-        current_page = min(total_pages, (self.scroll_pos // page_size) + 1)
-
-        if len(self.results_list) > 1 and total_pages > 1:
-            win.addstr(0, 2, f" Results: {len(self.results_list)} Page: {current_page}/{total_pages} ")
-        else:
-            win.addstr(0, 2, f" Results: {len(self.results_list)} ")
-
+        lines_per_block = DETAIL_LINES if self.detailed_view else 1
         current_display_line = 1
-        for result in self.results_list[self.scroll_pos:]:
+        visible_domains = []
+        for result in self.view.page(self.scroll_pos, self._page_size()):
             if current_display_line + lines_per_block > h - 1:
                 break
 
@@ -91,6 +198,12 @@ class GUI:
                 win.addstr(current_display_line + 4, 2, f"Expires:    {result.get('expires_on', 'N/A')} ({result.get('days_left', 'N/A')} days)")
                 win.addstr(current_display_line + 5, 2, "Status:     ")
                 win.addstr(current_display_line + 5, 14, result.get('status', 'N/A'), color | curses.A_BOLD)
+                timings = result.get('timings')
+                if timings:
+                    timing_str = ", ".join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in timings.items())
+                    win.addstr(current_display_line + 6, 2, f"Timings:    {timing_str}"[:w - 4])
+                if result.get('fingerprint'):
+                    win.addstr(current_display_line + 7, 2, self._cert_line(result)[:w - 4])
                 current_display_line += lines_per_block
             else: # Compact view
                 domain_str = result.get('domain', 'N/A')
@@ -99,130 +212,250 @@ class GUI:
                 win.addstr(current_display_line, 2, display_str)
                 win.addstr(current_display_line, 2 + len(display_str), status_str, color | curses.A_BOLD)
                 current_display_line += lines_per_block
+            if result.get('domain') and status not in ["INFO", "ERROR", "UNKNOWN"]:
+                visible_domains.append(result['domain'])
         win.noutrefresh()
 
-    def _draw(self, redraw):
-        if not redraw: return False
+        prefetch = self.checker_functions.get('whois_prefetch')
+        if prefetch and visible_domains:
+            prefetch(visible_domains)
+
+    def _draw(self):
+        """
+        Repaints the regions marked dirty. The header only changes with the
+        mode, typing only touches the input box, and results only repaint the
+        output window when they land on the visible page.
+        """
+        dirty = self.dirty
+        if self.view.sync() is not None:
+            dirty.add('output') # The store was replaced since the last frame
+        if 'chrome' in dirty:
+            dirty.update(REGIONS) # Erasing the screen uncovers every window
         h, w = self.stdscr.getmaxyx()
-        self.stdscr.erase()
-        self.stdscr.addstr(1, (w - 27) // 2, "SSL Certificate Checker", curses.A_BOLD | curses.A_UNDERLINE)
-        prompt = "Enter domain name:" if self.app_mode == 'DOMAIN_INPUT' else "Enter file path:"
-        self.stdscr.addstr(3, (w - len(prompt)) // 2, prompt)
-        help_text = "Ctrl-X: Help  |  Ctrl-C: Quit"
-        self.stdscr.addstr(h - 2, 2, help_text)
-        self.stdscr.noutrefresh()
-
-        self.input_win.erase()
-        self.input_win.box()
-        label_text = " Domain Input " if self.app_mode == 'DOMAIN_INPUT' else " Import Domains "
-        self.input_win.addstr(0, 2, f" {label_text} ")
-        self.input_win.addstr(1, 2, self.domain_input_str)
-        self.input_win.noutrefresh()
-
-        self._draw_output_window()
+        if 'chrome' in dirty:
+            self.stdscr.erase()
+            self.stdscr.addstr(1, (w - 27) // 2, "SSL Certificate Checker", curses.A_BOLD | curses.A_UNDERLINE)
+            prompts = {'DOMAIN_INPUT': "Enter domain name:", 'FILE_INPUT': "Enter file path:",
+                       'ATTACHED': f"Attached to monitor: {self.attach_path}",
+                       'FILTER_INPUT': "Filter results (status:X  issuer:X  days<N  text), empty to clear:"}
+            prompt = prompts[self.app_mode][:w - 4]
+            self.stdscr.addstr(3, (w - len(prompt)) // 2, prompt)
+        if 'status' in dirty:
+            help_text = f"Ctrl-X: Help  |  Ctrl-C: Quit  |  {self.metrics.summary()}"
+            self.stdscr.move(h - 2, 0)
+            self.stdscr.clrtoeol()
+            self.stdscr.addstr(h - 2, 2, help_text[:w - 4])
+            self.stdscr.noutrefresh()
+
+        if 'input' in dirty:
+            self.input_win.erase()
+            self.input_win.box()
+            labels = {'DOMAIN_INPUT': " Domain Input ", 'FILE_INPUT': " Import Domains ", 'ATTACHED': " Live Monitor ",
+                      'FILTER_INPUT': " Filter "}
+            label_text = labels[self.app_mode]
+            self.input_win.addstr(0, 2, f" {label_text} ")
+            self.input_win.addstr(1, 2, self.domain_input_str)
+
+        if 'output' in dirty:
+            self._draw_output_window()
+        elif 'title' in dirty:
+            self._draw_output_title()
         self.input_win.move(1, 2 + len(self.domain_input_str))
-        return False # Reset redraw flag
+        self.input_win.noutrefresh() # Last, so the cursor ends up in the input box
+        dirty.clear()
+        self.last_frame = time.monotonic()
 
     def run(self):
-        redraw = True
-        while True:
-            # First, draw the screen if a redraw is needed.
-            redraw = self._draw(redraw)
-            curses.doupdate() # Perform all staged refreshes
+        try:
+            self._main_loop()
+        finally:
+            self.pool.cancel() # Stop any batch still in flight when the user quits
 
-            # Now, wait for input. This is the only blocking call in the main loop.
+    def _main_loop(self):
+        while True:
+            # Paint at most once per frame; events in between only mark regions dirty.
+            if self.dirty and time.monotonic() - self.last_frame >= FRAME_INTERVAL:
+                self._draw()
+                curses.doupdate() # Perform all staged refreshes
+
+            # Now sleep until a key is pressed, a worker delivers a result or
+            # the next frame is due. This is the only blocking call in the main loop.
+            ready = self._wait(self.main_selector, self._loop_timeout())
+            if 'input' in ready:
+                for key_pressed in self._read_keys(self.input_win):
+                    if self._handle_key(key_pressed): self._invalidate()
+            if 'ssl' in ready: self._apply_results()
+            if 'whois' in ready:
+                self.whois_channel.drain() # Answers for popups that were already closed
+
+            self.active_threads = self.pool.active
+            if self.is_checking and self.reader:
+                self.throughput.update(self.batch_done)
+                self._invalidate('title') # Keep the import progress current
+            if self.is_checking and not self.pool.busy and not len(self.ssl_channel):
+                self.is_checking = False
+                self._invalidate('title')
+            if self.attach_path: self._poll_attached_state()
+
+    def _loop_timeout(self):
+        """Seconds the main loop may sleep: until the next frame if something is dirty."""
+        timeout = self._housekeeping_timeout()
+        if self.dirty:
+            frame_wait = max(0.0, self.last_frame + FRAME_INTERVAL - time.monotonic())
+            timeout = frame_wait if timeout is None else min(timeout, frame_wait)
+        return timeout
+
+    def _housekeeping_timeout(self):
+        """Seconds to sleep without events: none when idle, short while something may change."""
+        return HOUSEKEEPING_INTERVAL if self.is_checking or self.attach_path else None
+
+    def _wait(self, selector, timeout):
+        """Blocks until one of the selector's sources is ready. Returns the labels of the ready ones."""
+        return {key.data for key, _ in selector.select(timeout)}
+
+    def _read_keys(self, win):
+        """Yields every key already waiting on stdin without blocking."""
+        while True:
             try:
-                # Get input from the window that has the cursor
-                key_pressed = self.input_win.getch()
+                key = win.getch()
             except curses.error:
-                key_pressed = -1
-
-            # Process input
-            if key_pressed == -1:
-                pass # Timeout, do nothing
-            elif key_pressed == curses.KEY_MOUSE:
-                try:
-                    _, mx, my, _, _ = curses.getmouse()
-                    if self.output_win.enclose(my, mx):
-                        self._handle_mouse_click(my, mx)
-                except curses.error:
-                    pass # Ignore mouse errors
-                redraw = True
-            elif key_pressed == 6: # Ctrl-F
-                self.app_mode = 'FILE_INPUT' if self.app_mode == 'DOMAIN_INPUT' else 'DOMAIN_INPUT'
-                self.domain_input_str = ""
-                redraw = True
-            elif key_pressed == 4: # Ctrl-D
-                self.detailed_view = not self.detailed_view
+                return
+            if key == -1:
+                return
+            yield key
+
+    def _apply_results(self):
+        """Applies one batch of SSL results and marks the regions they change."""
+        results = self.ssl_channel.drain(RESULT_BATCH)
+        if not results:
+            return
+        for new_result in results:
+            self.metrics.observe(new_result)
+            self.cert_groups.add(new_result)
+            self.batch_done += 1
+            if len(self.results) and self.results[0].get("status") == "INFO": # First result replaces the placeholder
+                self.results.replace([new_result])
                 self.scroll_pos = 0
-                redraw = True
-            elif key_pressed == 24: # Ctrl-X
-                # This must be the last action for this key.
-                # It will block until the popup is closed.
-                self._display_help_popup()
-                redraw = True # Redraw main screen after popup closes
-            elif key_pressed == curses.KEY_LEFT:
-                lines_per_block = 7 if self.detailed_view else 1
-                page_size = max(1, (self.output_win.getmaxyx()[0] - 2) // lines_per_block)
-                if self.scroll_pos > 0:
-                    self.scroll_pos = max(0, self.scroll_pos - page_size)
-                    redraw = True
-            elif key_pressed == curses.KEY_RIGHT:
-                lines_per_block = 7 if self.detailed_view else 1
-                page_size = max(1, (self.output_win.getmaxyx()[0] - 2) // lines_per_block)
-                if self.scroll_pos + page_size < len(self.results_list):
-                    self.scroll_pos += page_size
-                    redraw = True
-            elif key_pressed in [curses.KEY_BACKSPACE, 127, 8]:
-                self.domain_input_str = self.domain_input_str[:-1]
-                redraw = True
-            elif key_pressed in [10, 13, curses.KEY_ENTER]:
-                if not self.is_checking and self.domain_input_str.strip():
-                    input_str = self.domain_input_str.strip()
-                    if self.app_mode == 'DOMAIN_INPUT':
+            else:
+                self.results.append(new_result)
+        self.throughput.update(self.batch_done)
+        self._invalidate('title', 'status')
+        first_changed = self.view.sync()
+        if first_changed is not None and first_changed < self.scroll_pos + self._page_size():
+            self._invalidate('output')
+
+    def _start_batch(self, placeholder):
+        self.results.replace([{"status": "INFO", "message": placeholder}])
+        self.scroll_pos = 0
+        self.batch_done = 0
+        self.throughput.reset()
+        self.cert_groups.clear()
+
+    def _handle_key(self, key_pressed):
+        """Processes one key press. Returns True if the whole screen needs redrawing."""
+        redraw = False
+        if key_pressed == curses.KEY_MOUSE:
+            try:
+                _, mx, my, _, _ = curses.getmouse()
+                if self.output_win.enclose(my, mx):
+                    self._handle_mouse_click(my, mx)
+            except curses.error:
+                pass # Ignore mouse errors
+            redraw = True
+        elif self.app_mode == 'ATTACHED' and (key_pressed in [6, 10, 13, curses.KEY_ENTER] or 32 <= key_pressed <= 126):
+            pass # The monitor owns the results while attached
+        elif key_pressed == 6 and self.app_mode != 'FILTER_INPUT': # Ctrl-F
+            self.app_mode = 'FILE_INPUT' if self.app_mode == 'DOMAIN_INPUT' else 'DOMAIN_INPUT'
+            self.domain_input_str = ""
+            redraw = True
+        elif key_pressed == 7: # Ctrl-G
+            if self.app_mode == 'FILTER_INPUT':
+                self.app_mode, self.domain_input_str = self.filter_return_mode, ""
+            else:
+                self.filter_return_mode, self.app_mode = self.app_mode, 'FILTER_INPUT'
+                self.domain_input_str = self.view.query
+            redraw = True
+        elif key_pressed == 15: # Ctrl-O
+            next_key = SORT_CYCLE[(SORT_CYCLE.index(self.view.sort_key) + 1) % len(SORT_CYCLE)]
+            self.view.set_sort(next_key, self.view.reverse)
+            self.scroll_pos = 0
+            self._invalidate('output')
+        elif key_pressed == 18: # Ctrl-R
+            self.view.set_sort(self.view.sort_key, not self.view.reverse)
+            self.scroll_pos = 0
+            self._invalidate('output')
+        elif key_pressed == 4: # Ctrl-D
+            self.detailed_view = not self.detailed_view
+            self.scroll_pos = 0
+            self._invalidate('output')
+        elif key_pressed == 24: # Ctrl-X
+            # This must be the last action for this key.
+            # It will block until the popup is closed.
+            self._display_help_popup()
+            redraw = True # Redraw main screen after popup closes
+        elif key_pressed == curses.KEY_LEFT:
+            if self.scroll_pos > 0:
+                self.scroll_pos = max(0, self.scroll_pos - self._page_size())
+                self._invalidate('output')
+        elif key_pressed == curses.KEY_RIGHT:
+            page_size = self._page_size()
+            if self.scroll_pos + page_size < len(self.view):
+                self.scroll_pos += page_size
+                self._invalidate('output')
+        elif key_pressed in [curses.KEY_BACKSPACE, 127, 8]:
+            self.domain_input_str = self.domain_input_str[:-1]
+            self._invalidate('input')
+        elif key_pressed in [10, 13, curses.KEY_ENTER] and self.app_mode == 'FILTER_INPUT':
+            self.view.set_filter(self.domain_input_str.strip())
+            self.app_mode, self.domain_input_str = self.filter_return_mode, ""
+            self.scroll_pos = 0
+            redraw = True
+        elif key_pressed in [10, 13, curses.KEY_ENTER]:
+            if not self.is_checking and self.domain_input_str.strip():
+                input_str = self.domain_input_str.strip()
+                if self.app_mode == 'DOMAIN_INPUT':
+                    self.is_checking = True
+                    self.reader = None
+                    self._start_batch(f"Please wait, checking SSL cert for '{input_str}'...")
+                    self.pool.submit(input_str)
+                else: # FILE_INPUT mode
+                    try:
+                        self.reader = TargetReader(input_str)
                         self.is_checking = True
-                        self.results_list = [{"status": "INFO", "message": f"Please wait, checking SSL cert for '{input_str}'..."}]
-                        self.scroll_pos = 0
-                        threading.Thread(target=self.checker_functions['ssl'], args=(input_str, self.result_queue)).start()
-                    else: # FILE_INPUT mode
-                        try:
-                            with open(input_str, 'r') as f:
-                                domains = [line.strip() for line in f if line.strip()]
-                            if domains:
-                                self.is_checking = True
-                                self.results_list = [{"status": "INFO", "message": f"Processing {len(domains)} domains from '{input_str}'..."}]
-                                self.active_threads = len(domains)
-                                self.scroll_pos = 0
-                                for domain in domains:
-                                    threading.Thread(target=self.checker_functions['ssl'], args=(domain, self.result_queue)).start()
-                        except FileNotFoundError:
-                            self.results_list = [{"status": "ERROR", "message": f"File not found: '{input_str}'"}]
-                        self.app_mode = 'DOMAIN_INPUT'
-                    self.domain_input_str = ""
-                    redraw = True
-            elif 32 <= key_pressed <= 126:
-                self.domain_input_str += chr(key_pressed)
+                        self._start_batch(f"Processing domains from '{input_str}'...")
+                        self.pool.feed(self.reader)
+                    except FileNotFoundError:
+                        self.results.replace([{"status": "ERROR", "message": f"File not found: '{input_str}'"}])
+                    except OSError as e:
+                        self.results.replace([{"status": "ERROR", "message": f"Could not read '{input_str}': {e.strerror}"}])
+                    self.app_mode = 'DOMAIN_INPUT'
+                self.domain_input_str = ""
                 redraw = True
-
-            # Process results from the queue
-            redraw_main = False
-            while not self.result_queue.empty():
-                try:
-                    # Peek at the result without removing it
-                    result = self.result_queue.queue[0]
-                    if str(result.get("status", "")).startswith("WHOIS"):
-                        break # Let the popup handle this
-
-                    new_result = self.result_queue.get_nowait()
-                    is_batch_job = self.results_list and self.results_list[0].get("status") == "INFO"
-                    if self.active_threads > 0: self.active_threads -= 1
-                    self.results_list = [new_result] if is_batch_job else self.results_list + [new_result]
-                    if is_batch_job: self.scroll_pos = 0
-                    redraw_main = True
-                except (queue.Empty, IndexError):
-                    break
-            if self.is_checking and self.active_threads == 0: self.is_checking = False
-            if redraw_main: redraw = True
+        elif 32 <= key_pressed <= 126:
+            self.domain_input_str += chr(key_pressed)
+            self._invalidate('input')
+
+        return redraw
+
+    def _poll_attached_state(self):
+        """Reloads the monitor's state file when it changes."""
+        try:
+            mtime = os.stat(self.attach_path).st_mtime
+            if mtime == self.attach_mtime:
+                return
+            self.results.replace(load_state(self.attach_path))
+            self.cert_groups.clear()
+            for result in self.results:
+                self.cert_groups.add(result)
+            self.attach_mtime = mtime
+        except FileNotFoundError:
+            if len(self.results): return
+            self.results.replace([{"status": "INFO", "message": f"Waiting for monitor state in '{self.attach_path}'..."}])
+        except (OSError, ValueError):
+            return # Try again on the next pass
+        self.view.sync()
+        self.scroll_pos = min(self.scroll_pos, max(0, len(self.view) - 1))
+        self._invalidate('output')
 
     def _handle_mouse_click(self, y, x):
         # Curses y,x are relative to screen, need to convert to window-relative
@@ -232,14 +465,14 @@ class GUI:
         if not (1 <= rel_y < self.output_win.getmaxyx()[0] - 1):
             return # Click was on border or outside
 
-        lines_per_block = 7 if self.detailed_view else 1
+        lines_per_block = DETAIL_LINES if self.detailed_view else 1
         clicked_index = self.scroll_pos + ((rel_y - 1) // lines_per_block)
 
-        if 0 <= clicked_index < len(self.results_list):
-            result = self.results_list[clicked_index]
+        if 0 <= clicked_index < len(self.view):
+            result = self.view[clicked_index]
             domain = result.get('domain')
             if domain and result.get('status') not in ['INFO', 'ERROR', 'UNKNOWN']:
-                threading.Thread(target=self.checker_functions['whois'], args=(domain, self.result_queue)).start()
+                threading.Thread(target=self.checker_functions['whois'], args=(domain, self.whois_channel)).start()
                 self._display_whois_popup(domain)
 
     def _display_whois_popup(self, domain):
@@ -248,13 +481,21 @@ class GUI:
         popup_y, popup_x = 3, 5
         popup_win = curses.newwin(popup_h, popup_w, popup_y, popup_x)
         popup_win.keypad(True)
-        popup_win.timeout(100)
+        popup_win.nodelay(True)
 
         whois_data = None
         scroll_pos = 0
 
         self.popup_active = True
         while True:
+            # --- Check for whois result ---
+            if whois_data is None:
+                for result in self.whois_channel.drain():
+                    if result.get("domain") == domain:
+                        whois_data = result
+            else:
+                self.whois_channel.drain() # Late answers for popups already closed
+
             # --- Draw Popup ---
             popup_win.erase()
             popup_win.box()
@@ -273,51 +514,44 @@ class GUI:
 
             popup_win.refresh()
 
-            # --- Check for whois result ---
-            if whois_data is None:
-                try:
-                    result = self.result_queue.get_nowait()
-                    if result.get("status", "").startswith("WHOIS"):
-                        whois_data = result
-                except queue.Empty:
-                    pass
-
             # --- Handle Input ---
-            try:
-                key = popup_win.getch()
-            except curses.error:
-                key = -1
-
-            if key == curses.KEY_MOUSE:
-                try:
-                    _, mx, my, _, bstate = curses.getmouse() # bstate is a bitmask
-
-                    # Check for close button click
-                    rel_y, rel_x = my - popup_y, mx - popup_x
-                    is_left_click = (hasattr(curses, 'BUTTON1_PRESSED') and bstate & curses.BUTTON1_PRESSED) or \
-                                    (hasattr(curses, 'BUTTON1_CLICKED') and bstate & curses.BUTTON1_CLICKED)
-
-                    if is_left_click and rel_y == 0 and rel_x == popup_w - 2:
-                        break # Close the popup
-
-                    # Check for scroll wheel up (BUTTON4_PRESSED)
-                    elif hasattr(curses, 'BUTTON4_PRESSED') and bstate & curses.BUTTON4_PRESSED:
-                        scroll_pos = max(0, scroll_pos - 3) # Scroll by 3 lines for a better feel
-                    # Check for scroll wheel down (BUTTON5_PRESSED)
-                    elif hasattr(curses, 'BUTTON5_PRESSED') and bstate & curses.BUTTON5_PRESSED:
-                        if whois_data and whois_data.get('data'):
-                            max_scroll = len(whois_data['data'].split('\n')) - (popup_h - 2)
-                            scroll_pos = min(max(0, max_scroll), scroll_pos + 3)
-                except curses.error:
-                    pass # Ignore mouse errors
-            elif key in [ord('q'), ord('Q')]:
+            # Sleep until a key is pressed or the whois answer arrives.
+            self._wait(self.popup_selector, None)
+            closed = False
+            for key in self._read_keys(popup_win):
+                if key == curses.KEY_MOUSE:
+                    try:
+                        _, mx, my, _, bstate = curses.getmouse() # bstate is a bitmask
+
+                        # Check for close button click
+                        rel_y, rel_x = my - popup_y, mx - popup_x
+                        is_left_click = (hasattr(curses, 'BUTTON1_PRESSED') and bstate & curses.BUTTON1_PRESSED) or \
+                                        (hasattr(curses, 'BUTTON1_CLICKED') and bstate & curses.BUTTON1_CLICKED)
+
+                        if is_left_click and rel_y == 0 and rel_x == popup_w - 2:
+                            closed = True # Close the popup
+
+                        # Check for scroll wheel up (BUTTON4_PRESSED)
+                        elif hasattr(curses, 'BUTTON4_PRESSED') and bstate & curses.BUTTON4_PRESSED:
+                            scroll_pos = max(0, scroll_pos - 3) # Scroll by 3 lines for a better feel
+                        # Check for scroll wheel down (BUTTON5_PRESSED)
+                        elif hasattr(curses, 'BUTTON5_PRESSED') and bstate & curses.BUTTON5_PRESSED:
+                            if whois_data and whois_data.get('data'):
+                                max_scroll = len(whois_data['data'].split('\n')) - (popup_h - 2)
+                                scroll_pos = min(max(0, max_scroll), scroll_pos + 3)
+                    except curses.error:
+                        pass # Ignore mouse errors
+                elif key in [ord('q'), ord('Q')]:
+                    closed = True
+                elif key == curses.KEY_UP:
+                    scroll_pos = max(0, scroll_pos - 1)
+                elif key == curses.KEY_DOWN:
+                    if whois_data and whois_data.get('data'):
+                        max_scroll = len(whois_data['data'].split('\n')) - (popup_h - 2)
+                        scroll_pos = min(max(0, max_scroll), scroll_pos + 1)
+
+            if closed:
                 break
-            elif key == curses.KEY_UP:
-                scroll_pos = max(0, scroll_pos - 1)
-            elif key == curses.KEY_DOWN:
-                if whois_data and whois_data.get('data'):
-                    max_scroll = len(whois_data['data'].split('\n')) - (popup_h - 2)
-                    scroll_pos = min(max(0, max_scroll), scroll_pos + 1)
 
         # Cleanup
         del popup_win
@@ -326,11 +560,11 @@ class GUI:
 
     def _display_help_popup(self):
         h, w = self.stdscr.getmaxyx()
-        popup_h, popup_w = 15, 80
+        popup_h, popup_w = 19, 80
         popup_y, popup_x = (h - popup_h) // 2, (w - popup_w) // 2
         popup_win = curses.newwin(popup_h, popup_w, popup_y, popup_x)
         popup_win.keypad(True)
-        popup_win.timeout(100) # Use a non-blocking getch, essential for the loop
+        popup_win.nodelay(True) # Keys are read only once the selector reports stdin readable
 
         help_lines = [
             ("General", ""),
@@ -341,6 +575,9 @@ class GUI:
             ("Navigation", ""),
             ("  Ctrl-D", "Toggle between compact and detailed results view."),
             ("  ← / →", "Page through results list."),
+            ("  Ctrl-O", "Cycle the sort order: arrival, days left, status, issuer, domain."),
+            ("  Ctrl-R", "Reverse the sort order."),
+            ("  Ctrl-G", "Filter results, e.g. 'days<30 status:warning issuer:encrypt'."),
             ("  Mouse Click", "On a domain to view its WHOIS information."),
             ("  Ctrl-X", "Display this help screen."),
             ("Popups (WHOIS/Help)", ""),
@@ -367,8 +604,8 @@ class GUI:
             popup_win.refresh()
 
             # Wait for a specific key to close, ignoring the initial Ctrl-H.
-            key = popup_win.getch()
-            if key != -1: # Break on any key press
+            self._wait(self.input_selector, None)
+            if next(self._read_keys(popup_win), -1) != -1: # Break on any key press
                 break
 
         # Cleanup
@@ -0,0 +1,172 @@
+import csv
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+
+from metrics import PHASES, RunMetrics
+from records import FIELDS, CertRecord, CertificateGroups
+from targets import TargetReader
+
+FAILING_STATUSES = ("EXPIRED", "ALERT")
+
+
+class NdjsonWriter:
+    """Writes one JSON object per line."""
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, result):
+        self.stream.write(json.dumps(result.to_dict()) + "\n")
+        self.stream.flush()
+
+
+class CsvWriter:
+    """Writes a header row followed by one row per result, with one column per timed phase."""
+    def __init__(self, stream):
+        self.stream = stream
+        fieldnames = FIELDS + [f"{phase}_seconds" for phase in PHASES]
+        self.writer = csv.DictWriter(stream, fieldnames=fieldnames, extrasaction='ignore')
+        self.writer.writeheader()
+
+    def write(self, result):
+        row = result.to_dict()
+        for phase, seconds in result.get("timings", {}).items():
+            row[f"{phase}_seconds"] = seconds
+        self.writer.writerow(row)
+        self.stream.flush()
+
+
+WRITERS = {'ndjson': NdjsonWriter, 'csv': CsvWriter}
+
+
+def write_cert_groups(groups, path):
+    """Writes one JSON line per certificate with every host it was served on, most shared first."""
+    with open(path, 'w') as f:
+        for group in groups.to_dicts():
+            f.write(json.dumps(group) + "\n")
+
+
+class PendingTargets:
+    """
+    Feeds targets to a pool while keeping track of those handed out without
+    a result yet, so a run cut short by --deadline accounts for every target.
+    Reading the next target can block on a slow pipe, so it happens outside
+    the lock that done() takes. With `drain`, stop() also returns the targets
+    never read; leave it off for pipes, where they may not have arrived yet.
+    """
+    def __init__(self, targets, drain=True):
+        self._targets = iter(targets)
+        self._drain = drain
+        self._pending = {} # target -> None, an insertion-ordered set
+        self._stopped = False
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock() # Held while reading from `targets`, which only one thread may do
+
+    def __iter__(self):
+        while not self._stopped:
+            with self._read_lock:
+                target = next(self._targets, None)
+            if target is None:
+                return
+            with self._lock:
+                if self._stopped:
+                    return # Read after the deadline: stop() has already accounted for the input
+                self._pending[target] = None
+            yield target
+
+    def done(self, target):
+        with self._lock:
+            self._pending.pop(target, None)
+
+    def stop(self):
+        """Stops feeding. Returns the targets without a result: those handed out, then (with `drain`) the ones never read."""
+        with self._lock:
+            self._stopped = True
+            pending = list(self._pending)
+        return itertools.chain(pending, self._unread()) if self._drain else pending
+
+    def _unread(self):
+        with self._read_lock:
+            yield from self._targets
+
+
+def scan(args, checker_functions, pool_factory, stream=None):
+    """
+    Checks every domain in `args.file` and streams each result to `stream` as
+    soon as it completes. Returns 1 if any certificate is EXPIRED or ALERT.
+    With args.deadline, targets still unchecked when it passes are reported
+    as UNKNOWN rather than waited for; from a pipe, only those read by then.
+    """
+    stream = stream or sys.stdout
+    try:
+        reader = TargetReader(args.file)
+    except OSError as e:
+        print(f"Could not read '{args.file}': {e}", file=sys.stderr)
+        return 2
+
+    result_queue = queue.Queue()
+    try:
+        pool = pool_factory(checker_functions['ssl'], result_queue).start()
+    except OSError as e:
+        print(f"Could not start checking: {e}", file=sys.stderr)
+        return 2
+    targets = PendingTargets(reader, drain=not reader.streaming)
+    pool.feed(targets)
+    deadline = time.monotonic() + args.deadline if args.deadline else None
+
+    writer = WRITERS[args.format](stream)
+    metrics = RunMetrics()
+    groups = CertificateGroups() if args.certs else None # Holds every host, so only built when asked for
+    failed = mismatched = unknown = 0
+
+    def report(result):
+        nonlocal failed, mismatched
+        targets.done(result.get("domain"))
+        writer.write(result)
+        metrics.observe(result)
+        if groups is not None:
+            groups.add(result)
+        if result.get("mismatch"):
+            mismatched += 1 # Its addresses serve different certificates (--all-addresses)
+        if result.get("status") in FAILING_STATUSES:
+            failed += 1
+
+    try:
+        while True:
+            if deadline is not None and time.monotonic() >= deadline:
+                pool.cancel()
+                # Results that made it in time are still reported; checks in flight are abandoned
+                while not result_queue.empty():
+                    report(result_queue.get_nowait())
+                for target in targets.stop():
+                    report(CertRecord(target, "UNKNOWN", message="Not checked before the run deadline."))
+                    unknown += 1
+                break
+            try:
+                result = result_queue.get(timeout=0.2)
+            except queue.Empty:
+                if not pool.busy and result_queue.empty():
+                    break
+                continue
+            report(result)
+    except KeyboardInterrupt:
+        pool.cancel()
+        return 130
+    finally:
+        print(f"Targets: {reader.progress()}", file=sys.stderr)
+        print(metrics.summary(), file=sys.stderr)
+        if groups:
+            print(f"Certificates: {len(groups)} distinct across {groups.host_count()} hosts", file=sys.stderr)
+        if mismatched:
+            print(f"Backend mismatches: {mismatched} hosts serve different certificates on different "
+                  f"addresses", file=sys.stderr)
+        if unknown:
+            print(f"Deadline reached: {unknown} targets not checked", file=sys.stderr)
+        if args.metrics:
+            metrics.write(args.metrics)
+        if groups is not None:
+            write_cert_groups(groups, args.certs)
+    return 1 if failed else 0
@@ -0,0 +1,169 @@
+import collections
+import os
+import threading
+import time
+
+PHASES = ["resolve", "connect", "handshake", "parse"]
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0] # Seconds
+
+
+class Histogram:
+    """
+    A cumulative-bucket latency histogram in the Prometheus style. Memory is
+    fixed regardless of how many observations are made.
+    """
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1) # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """Estimates the q-quantile by interpolating inside its bucket, like histogram_quantile()."""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bound in enumerate(self.buckets):
+            if seen + self.counts[i] >= rank:
+                fraction = (rank - seen) / self.counts[i] if self.counts[i] else 0
+                return lower + (bound - lower) * fraction
+            seen += self.counts[i]
+            lower = bound
+        return self.buckets[-1] # Beyond the largest bucket
+
+
+class AdaptiveTimeout:
+    """
+    A per-check timeout that follows the latency of the current run: a
+    multiple of the p99 of successful checks, kept between `floor` and
+    `ceiling`. Until `min_samples` checks have succeeded the ceiling applies.
+    """
+    def __init__(self, ceiling, floor=1.0, multiplier=3.0, min_samples=50):
+        self.ceiling = ceiling
+        self.floor = min(floor, ceiling)
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.histogram = Histogram()
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self.histogram.observe(seconds)
+
+    def timeout(self):
+        with self._lock:
+            if self.histogram.count < self.min_samples:
+                return self.ceiling
+            p99 = self.histogram.quantile(0.99)
+        return max(self.floor, min(self.ceiling, p99 * self.multiplier))
+
+
+class Throughput:
+    """Completion rate over a sliding window, for progress bars and ETAs."""
+    def __init__(self, window=5.0):
+        self.window = window # Seconds of history the rate is taken over
+        self._samples = collections.deque() # (time, done) pairs
+
+    def reset(self):
+        self._samples.clear()
+
+    def update(self, done, now=None):
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, done))
+        while len(self._samples) > 2 and now - self._samples[1][0] >= self.window:
+            self._samples.popleft()
+
+    def rate(self):
+        """Completions per second, or None until there are two samples to compare."""
+        if len(self._samples) < 2:
+            return None
+        (start, first), (end, last) = self._samples[0], self._samples[-1]
+        return (last - first) / (end - start) if end > start else None
+
+    def eta(self, remaining):
+        """Seconds until `remaining` more completions at the current rate, or None."""
+        rate = self.rate()
+        return remaining / rate if rate else None
+
+
+class RunMetrics:
+    """Aggregates per-phase timings and status counts over a run."""
+    def __init__(self):
+        self.histograms = {phase: Histogram() for phase in PHASES + ["total"]}
+        self.statuses = {}
+        self.failed_phases = {}
+        self._lock = threading.Lock()
+
+    def observe(self, result):
+        timings = result.get("timings")
+        with self._lock:
+            status = result.get("status", "ERROR")
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if result.get("failed_phase"):
+                phase = result["failed_phase"]
+                self.failed_phases[phase] = self.failed_phases.get(phase, 0) + 1
+            if not timings or result.get("cached"):
+                return # Cache hits did no network work
+            for phase, seconds in timings.items():
+                if phase in self.histograms:
+                    self.histograms[phase].observe(seconds)
+            self.histograms["total"].observe(sum(timings.values()))
+
+    def percentiles(self, phase="total"):
+        with self._lock:
+            histogram = self.histograms[phase]
+            return [histogram.quantile(q) for q in (0.5, 0.95, 0.99)]
+
+    def summary(self):
+        """A one-line p50/p95/p99 summary of total check latency."""
+        p50, p95, p99 = self.percentiles()
+        if p50 is None:
+            return "Latency: n/a"
+        return f"Latency p50/p95/p99: {p50 * 1000:.0f}/{p95 * 1000:.0f}/{p99 * 1000:.0f} ms"
+
+    def to_prometheus(self):
+        """Renders the metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP sslwatch2_check_phase_seconds Time spent in each phase of a certificate check.",
+            "# TYPE sslwatch2_check_phase_seconds histogram",
+        ]
+        with self._lock:
+            for phase, histogram in self.histograms.items():
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ["+Inf"], histogram.counts):
+                    cumulative += count
+                    lines.append(f'sslwatch2_check_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {cumulative}')
+                lines.append(f'sslwatch2_check_phase_seconds_sum{{phase="{phase}"}} {histogram.sum:.6f}')
+                lines.append(f'sslwatch2_check_phase_seconds_count{{phase="{phase}"}} {histogram.count}')
+            lines += [
+                "# HELP sslwatch2_checks_total Checks completed, by result status.",
+                "# TYPE sslwatch2_checks_total counter",
+            ]
+            for status, count in sorted(self.statuses.items()):
+                lines.append(f'sslwatch2_checks_total{{status="{status}"}} {count}')
+            lines += [
+                "# HELP sslwatch2_check_failures_total Failed checks, by the phase that failed.",
+                "# TYPE sslwatch2_check_failures_total counter",
+            ]
+            for phase, count in sorted(self.failed_phases.items()):
+                lines.append(f'sslwatch2_check_failures_total{{phase="{phase}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically writes the exposition text, e.g. for node_exporter's textfile collector."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
@@ -0,0 +1,167 @@
+import heapq
+import itertools
+import json
+import os
+import queue
+import random
+import signal
+import sys
+import threading
+import time
+
+from metrics import RunMetrics
+from records import CertRecord
+from store import STATUS_ORDER
+
+# Seconds between checks for each status. OK certificates are re-checked
+# daily, anything close to or past expiry every few minutes.
+CHECK_INTERVALS = {
+    "EXPIRED": 5 * 60,
+    "ALERT": 5 * 60,
+    "ERROR": 15 * 60,
+    "WARNING": 60 * 60,
+    "OK": 24 * 60 * 60,
+}
+DEFAULT_INTERVAL = 15 * 60
+JITTER = 0.1           # Fraction of the interval added or removed at random
+STARTUP_SPREAD = 60    # Maximum seconds over which the first round of checks is spread
+STATE_INTERVAL = 5     # Minimum seconds between state file writes
+
+
+def next_interval(result, jitter=JITTER):
+    """Seconds until `result`'s target should be checked again."""
+    interval = CHECK_INTERVALS.get(result.get("status"), DEFAULT_INTERVAL)
+    days_left = result.get("days_left")
+    if result.get("status") == "OK" and isinstance(days_left, int):
+        # Never sleep past the point where the certificate would turn WARNING.
+        interval = min(interval, max(CHECK_INTERVALS["WARNING"], (days_left - 30) * 86400))
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+
+def load_state(path):
+    """Reads a state snapshot written by Monitor, returning its results as records."""
+    with open(path, 'r') as f:
+        return [CertRecord.from_dict(result) for result in json.load(f).get("results", [])]
+
+
+class Monitor:
+    """
+    Keeps a fleet of targets under watch. A heap keyed on each target's next
+    due time decides what to check next, and the re-check interval follows
+    the last result, so probe budget goes to certificates that need it.
+    """
+    def __init__(self, targets, check_function, pool_factory, state_path=None, on_change=None, metrics_path=None):
+        self.result_queue = queue.Queue()
+        self.pool = pool_factory(check_function, self.result_queue)
+        self.state_path = state_path
+        self.metrics_path = metrics_path
+        self.metrics = RunMetrics()
+        self.on_change = on_change # Called with each result whose status changed
+
+        # --- State ---
+        self.results = {}
+        self._due = []
+        self._seq = itertools.count()
+        self._in_flight = set()
+        self._dirty = False
+        self._last_write = 0
+        self.stop_event = threading.Event()
+
+        now = time.time()
+        spread = min(STARTUP_SPREAD, len(targets) / 100)
+        for target in targets:
+            self._schedule(target, now + random.uniform(0, spread))
+
+    def _schedule(self, target, due):
+        heapq.heappush(self._due, (due, next(self._seq), target))
+
+    def run(self):
+        """Runs until stop() is called or the process is interrupted."""
+        self.pool.start()
+        try:
+            while not self.stop_event.is_set():
+                self._submit_due()
+                wait = self._due[0][0] - time.time() if self._due else 1.0
+                try:
+                    result = self.result_queue.get(timeout=min(max(wait, 0.05), 1.0))
+                    self._record(result)
+                    while True:
+                        self._record(self.result_queue.get_nowait())
+                except queue.Empty:
+                    pass
+                self._write_state()
+        finally:
+            self.pool.cancel()
+            self._write_state(force=True)
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _submit_due(self):
+        limit = self.pool.concurrency * 2 # Keep the backlog short so new due times win
+        now = time.time()
+        while self._due and self._due[0][0] <= now and self.pool.active < limit:
+            _, _, target = heapq.heappop(self._due)
+            self._in_flight.add(target)
+            self.pool.submit(target)
+
+    def _record(self, result):
+        target = result.get("domain")
+        if target not in self._in_flight:
+            return
+        self._in_flight.discard(target)
+        self.metrics.observe(result)
+        now = time.time()
+        previous = self.results.get(target)
+        result["checked_at"] = now
+        result["next_check"] = now + next_interval(result)
+        self.results[target] = result
+        self._schedule(target, result["next_check"])
+        self._dirty = True
+        if self.on_change and (previous is None or previous.get("status") != result.get("status")):
+            self.on_change(result)
+
+    def snapshot(self):
+        """The current results, most urgent first."""
+        return sorted(self.results.values(),
+                      key=lambda r: (STATUS_ORDER.get(r.get("status"), 5), r.get("days_left", 0), r.get("domain", "")))
+
+    def _write_state(self, force=False):
+        if not self._dirty:
+            return
+        if not force and time.time() - self._last_write < STATE_INTERVAL:
+            return
+        if self.state_path:
+            state = {"updated": time.time(), "pending": len(self._due), "results": [result.to_dict() for result in self.snapshot()]}
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path) # Readers never see a partial file
+        if self.metrics_path:
+            self.metrics.write(self.metrics_path)
+        self._dirty = False
+        self._last_write = time.time()
+
+
+def run_monitor(args, checker_functions, pool_factory, stream=None):
+    """Runs the monitoring daemon, logging each status change as NDJSON."""
+    from targets import TargetReader
+    stream = stream or sys.stdout
+    try:
+        targets = list(TargetReader(args.file))
+    except OSError as e:
+        print(f"Could not read '{args.file}': {e}", file=sys.stderr)
+        return 2
+
+    def log_change(result):
+        stream.write(json.dumps(result.to_dict()) + "\n")
+        stream.flush()
+
+    monitor = Monitor(targets, checker_functions['ssl'], pool_factory, args.state, log_change, args.metrics)
+    signal.signal(signal.SIGTERM, lambda signum, frame: monitor.stop())
+    print(f"Monitoring {len(targets)} targets", file=sys.stderr)
+    try:
+        monitor.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
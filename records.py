@@ -0,0 +1,185 @@
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+DATE_FORMAT = "%Y-%m-%d"
+FIELDS = ["domain", "subject_cn", "issuer_cn", "issued_on", "expires_on", "days_left", "status", "message",
+          "fingerprint"]
+CERT_MEMO_SIZE = 10000 # Parsed certificates kept by fingerprint
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def format_date(epoch):
+    return time.strftime(DATE_FORMAT, time.gmtime(epoch))
+
+
+def parse_date(text):
+    import calendar # Slow to import and only needed to read results back from a cache or state file
+    return calendar.timegm(time.strptime(text, DATE_FORMAT))
+
+
+class CertRecord:
+    """
+    One check result in a compact form for large batches. Dates are kept as
+    epoch seconds and issuer, subject and status strings are interned; the
+    date strings and the status message are only built when a row is shown
+    or exported. get(), [] and `in` work like on the result dicts this
+    replaces, and to_dict() gives the exported form.
+    """
+    __slots__ = ("domain", "subject_cn", "issuer_cn", "issued_at", "expires_at", "days_left", "status",
+                 "_message", "fingerprint", "timings", "failed_phase", "cached", "extra")
+
+    def __init__(self, domain, status, subject_cn=None, issuer_cn=None, issued_at=None, expires_at=None,
+                 days_left=None, message=None, fingerprint=None):
+        self.domain = domain
+        self.status = _intern(status)
+        self.subject_cn = _intern(subject_cn)
+        self.issuer_cn = _intern(issuer_cn)
+        self.issued_at = issued_at
+        self.expires_at = expires_at
+        self.days_left = days_left
+        self._message = message # Only set when it says more than the status, e.g. for errors
+        self.fingerprint = fingerprint # SHA-256 of the DER certificate
+        self.timings = None
+        self.failed_phase = None
+        self.cached = None
+        self.extra = None # Keys without a slot of their own, e.g. the monitor's schedule
+
+    @classmethod
+    def from_dict(cls, data):
+        """Builds a record from an exported result, e.g. one read back from a cache or state file."""
+        data = dict(data)
+        record = cls(data.pop("domain", None), data.pop("status", "ERROR"))
+        for key, value in data.items():
+            record[key] = value
+        return record
+
+    def _lookup(self, key):
+        if key == "issued_on":
+            return None if self.issued_at is None else format_date(self.issued_at)
+        if key == "expires_on":
+            return None if self.expires_at is None else format_date(self.expires_at)
+        if key == "message":
+            return self._message or f"Status: {self.status}"
+        if key in ("domain", "subject_cn", "issuer_cn", "issued_at", "expires_at", "days_left", "status",
+                   "fingerprint", "timings", "failed_phase", "cached"):
+            return getattr(self, key)
+        return self.extra.get(key) if self.extra else None
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        return default if value is None else value
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def __setitem__(self, key, value):
+        if key == "issued_on":
+            self.issued_at = parse_date(value)
+        elif key == "expires_on":
+            self.expires_at = parse_date(value)
+        elif key == "message":
+            self._message = None if value == f"Status: {self.status}" else value
+        elif key in ("subject_cn", "issuer_cn", "status"):
+            setattr(self, key, _intern(value))
+        elif key in ("domain", "issued_at", "expires_at", "days_left", "fingerprint", "timings", "failed_phase",
+                     "cached"):
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def to_dict(self):
+        """The result as a plain dict with formatted dates, for JSON/CSV output."""
+        result = {}
+        for key in FIELDS + ["failed_phase", "cached", "timings"]:
+            value = self._lookup(key)
+            if value is not None:
+                result[key] = value
+        if self.extra:
+            result.update(self.extra)
+        return result
+
+    def __repr__(self):
+        return f"CertRecord({self.to_dict()!r})"
+
+
+class CertificateMemo:
+    """
+    Parsed certificate fields keyed by fingerprint, so a certificate served
+    for many hostnames is parsed once. The least recently used are dropped.
+    """
+    def __init__(self, capacity=CERT_MEMO_SIZE):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, fingerprint):
+        with self._lock:
+            fields = self._entries.get(fingerprint)
+            if fields is not None:
+                self._entries.move_to_end(fingerprint)
+            return fields
+
+    def put(self, fingerprint, fields):
+        with self._lock:
+            self._entries[fingerprint] = fields
+            self._entries.move_to_end(fingerprint)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+
+class CertificateGroups:
+    """
+    The hostnames each certificate was seen on, keyed by fingerprint, e.g.
+    to renew a shared wildcard certificate once for every host it covers.
+    """
+    def __init__(self):
+        self._hosts = {} # fingerprint -> {domain: None}, an insertion-ordered set
+        self._records = {} # fingerprint -> the first result seen with it
+
+    def add(self, result):
+        fingerprint = result.get("fingerprint")
+        if not fingerprint or not result.get("domain"):
+            return
+        if fingerprint not in self._hosts:
+            self._hosts[fingerprint] = {}
+            self._records[fingerprint] = result
+        self._hosts[fingerprint][result["domain"]] = None
+
+    def count(self, fingerprint):
+        return len(self._hosts.get(fingerprint, ()))
+
+    def hosts(self, fingerprint, limit=None):
+        return list(itertools.islice(self._hosts.get(fingerprint, ()), limit))
+
+    def clear(self):
+        self._hosts.clear()
+        self._records.clear()
+
+    def to_dicts(self):
+        """One dict per certificate with the hosts it covers, most widely shared first."""
+        for fingerprint in sorted(self._hosts, key=lambda fingerprint: -len(self._hosts[fingerprint])):
+            record = self._records[fingerprint]
+            group = {key: record.get(key) for key in ("fingerprint", "subject_cn", "issuer_cn", "issued_on",
+                                                      "expires_on", "days_left", "status")}
+            group["hosts"] = list(self._hosts[fingerprint])
+            yield group
+
+    def host_count(self):
+        return sum(len(hosts) for hosts in self._hosts.values())
+
+    def __len__(self):
+        return len(self._hosts)
@@ -0,0 +1,201 @@
+"""
+The DNS resolution stage. Addresses are cached for their record's TTL when
+dnspython is installed, or for a fixed DNS_TTL through getaddrinfo()
+otherwise, and hosts can be resolved ahead of their check so a batch
+never waits on DNS one lookup at a time.
+"""
+import ipaddress
+import queue
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from targets import split_target
+from workers import SingleFlight
+
+DNS_TTL = 300              # Seconds addresses are reused when the record's TTL is unknown
+NEGATIVE_TTL = 30          # Seconds a failed lookup is remembered, unless the failure was temporary
+MIN_TTL = 5                # Floor for record TTLs, so a TTL of 0 still helps a batch
+DNS_CACHE_SIZE = 100000    # Hosts kept in memory
+DNS_LIFETIME = 5           # Seconds dnspython may spend on one query
+PREFETCH_THREADS = 8       # Concurrent lookups ahead of the checks
+PREFETCH_BACKLOG = 1024    # Queued prefetches; further requests are dropped
+
+_dns = None # The dnspython package once loaded, False if it is not installed
+
+
+def _dnspython():
+    """
+    Imports dnspython on the first lookup rather than with this module, as
+    it is slow to load. Optional: without it, TTLs are unknown and
+    getaddrinfo() answers.
+    """
+    global _dns
+    if _dns is None:
+        try:
+            import dns.exception
+            import dns.resolver
+            _dns = dns
+        except ImportError:
+            _dns = False
+    return _dns
+
+
+def _query_records(dns, host, port):
+    """
+    Looks up AAAA and A records with dnspython. Returns (addresses, ttl), or
+    None to fall back to getaddrinfo(), e.g. for names only /etc/hosts knows.
+    """
+    addresses = []
+    ttls = []
+    for rdtype, family in (("AAAA", socket.AF_INET6), ("A", socket.AF_INET)):
+        try:
+            answer = dns.resolver.resolve(host, rdtype, raise_on_no_answer=False, lifetime=DNS_LIFETIME)
+        except dns.exception.DNSException:
+            continue
+        if answer.rrset is None:
+            continue
+        ttls.append(answer.rrset.ttl)
+        for record in answer:
+            sockaddr = (record.address, port, 0, 0) if family == socket.AF_INET6 else (record.address, port)
+            addresses.append((family, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', sockaddr))
+    if not addresses:
+        return None
+    return addresses, max(MIN_TTL, min(ttls))
+
+
+def interleave_families(addresses):
+    """
+    Orders getaddrinfo()-style addresses for Happy Eyeballs (RFC 8305):
+    alternating between address families, starting with the one the
+    resolver listed first, and keeping the order within each family.
+    """
+    families = OrderedDict()
+    for address in addresses:
+        families.setdefault(address[0], []).append(address)
+    if len(families) < 2:
+        return list(addresses)
+    ordered = []
+    groups = list(families.values())
+    for i in range(max(len(group) for group in groups)):
+        ordered.extend(group[i] for group in groups if i < len(group))
+    return ordered
+
+
+class Resolver:
+    """
+    Resolves hosts to getaddrinfo()-style address tuples through a cache
+    that honours record TTLs. Concurrent lookups of the same host share one
+    query, and prefetch() resolves queued targets on a few background
+    threads so their checks find the addresses ready.
+    """
+    def __init__(self, ttl=DNS_TTL, capacity=DNS_CACHE_SIZE, threads=PREFETCH_THREADS):
+        self.ttl = ttl
+        self.capacity = capacity
+        self.threads = threads
+        self._entries = OrderedDict() # (host, port) -> (expires, addresses, error), error being the exception raised
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._prefetch_queue = queue.Queue(maxsize=PREFETCH_BACKLOG)
+        self._prefetchers = []
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, host, port, timeout=None):
+        """
+        Returns the addresses of host:port, raising socket.gaierror like
+        getaddrinfo(). With a `timeout` the lookup runs on its own thread and
+        socket.timeout is raised if it takes longer; its answer is still
+        cached when it arrives.
+        """
+        key = (host.lower(), port)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._answer(entry)
+        fallback = (0, None, OSError(f"Could not look up '{host}'"))
+        return self._answer(self._flights.run(key, lambda: self._lead(key, host, port), fallback, timeout))
+
+    def _lead(self, key, host, port):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry # Cached by a lookup that finished after resolve() checked
+            self.misses += 1
+        entry = self._lookup(host, port)
+        if entry[0] > time.monotonic(): # Transient failures are not cached, so a retry asks again
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.capacity:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def cached(self, host, port):
+        """Returns the cached addresses of host:port without blocking, or None if they must be looked up."""
+        with self._lock:
+            entry = self._entries.get((host.lower(), port))
+            if not entry or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end((host.lower(), port))
+            self.hits += 1
+        return self._answer(entry)
+
+    def _answer(self, entry):
+        _, addresses, error = entry
+        if error is not None:
+            raise type(error)(*error.args) # A fresh exception for every caller
+        return addresses
+
+    def _lookup(self, host, port):
+        """Queries DNS and returns the cache entry for the answer."""
+        now = time.monotonic()
+        literal = False
+        try:
+            ipaddress.ip_address(host)
+            literal = True
+        except ValueError:
+            pass
+        dns = _dnspython() if not literal else None
+        if dns:
+            answer = _query_records(dns, host, port)
+            if answer is not None:
+                return now + answer[1], answer[0], None
+        try:
+            addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except (OSError, UnicodeError) as e:
+            if isinstance(e, socket.timeout) or getattr(e, "errno", None) == socket.EAI_AGAIN:
+                return now, None, e # Temporary: answered but not cached
+            return now + NEGATIVE_TTL, None, e
+        return now + self.ttl, addresses, None
+
+    def prefetch(self, targets):
+        """Resolves `targets` in the background, dropping requests when the backlog is full."""
+        if not self._prefetchers:
+            with self._lock:
+                while len(self._prefetchers) < self.threads:
+                    prefetcher = threading.Thread(target=self._prefetch_loop, daemon=True)
+                    prefetcher.start()
+                    self._prefetchers.append(prefetcher)
+        for target in targets:
+            try:
+                self._prefetch_queue.put_nowait(split_target(target))
+            except ValueError:
+                continue # The check reports the malformed target
+            except queue.Full:
+                break
+
+    def _prefetch_loop(self):
+        while True:
+            host, port = self._prefetch_queue.get()
+            try:
+                self.resolve(host, port)
+            except (OSError, UnicodeError):
+                pass # Cached for the check to report
+
+    def stats(self):
+        return f"DNS cache: {self.hits} hits, {self.misses} lookups, {len(self._entries)} hosts"
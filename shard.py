@@ -0,0 +1,304 @@
+"""
+Sharded execution: targets are split by a consistent hash of their host
+name across worker processes, locally or on other machines, and their
+results are merged back into one result queue.
+
+Coordinator and workers speak newline-delimited JSON over TCP. The worker
+greets with {"ready": true, "concurrency": N}, the coordinator sends one
+{"target": ...} line per target and the worker answers each with a result
+object. Closing the connection ends the session and cancels what is left.
+Workers share nothing but the targets they are sent, so per-host rate
+limits and caches stay local to each shard.
+"""
+import bisect
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from records import CertRecord
+from targets import split_target
+from workers import BasePool
+
+RING_REPLICAS = 128 # Points per node on the hash ring
+CONNECT_TIMEOUT = 10 # Seconds to wait for a worker to accept the coordinator and greet it
+
+
+def _ring_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+
+def parse_address(address):
+    """'host:port' or '[v6]:port' -> (host, port)."""
+    host, separator, port = address.rpartition(':')
+    if not separator or not host or not port.isdigit():
+        raise ValueError(f"Expected HOST:PORT, got '{address}'")
+    return host.strip('[]'), int(port)
+
+
+class HashRing:
+    """
+    A consistent hash ring. Each node owns many points on the ring, so
+    adding or removing a node moves only about 1/N of the keys.
+    """
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self._points = sorted((_ring_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._hashes = [point for point, _ in self._points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._hashes, _ring_hash(key)) % len(self._points)
+        return self._points[index][1]
+
+
+def shard_key(target):
+    """Targets are sharded by host, so every port of a host lands on the same worker."""
+    try:
+        host, _ = split_target(target)
+    except ValueError:
+        return target
+    return host.lower()
+
+
+class _WorkerConnection:
+    """The coordinator's end of one worker connection."""
+    def __init__(self, name, address, process=None):
+        self.name = name
+        self.address = address
+        self.process = process # Local worker subprocess, if we started it
+        self.sock = socket.create_connection(address, timeout=CONNECT_TIMEOUT) # Kept until the worker greets
+        self.rfile = self.sock.makefile('r', encoding='utf-8')
+        self.concurrency = 0
+        self.outstanding = {} # target -> submissions without a result yet
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send(self, message):
+        data = (json.dumps(message) + "\n").encode('utf-8')
+        with self.lock:
+            if self.closed:
+                raise OSError(f"Connection to worker {self.name} is closed")
+            self.sock.sendall(data)
+
+    def shutdown(self):
+        """Fails further sends, including one blocked in sendall() on a backed-up worker."""
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def close(self):
+        self.shutdown()
+        self.sock.close()
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait()
+
+
+def start_local_worker(worker_args):
+    """
+    Starts `sslwatch2.py worker` on an ephemeral localhost port and returns
+    (process, address) once it is listening.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sslwatch2.py")
+    process = subprocess.Popen([sys.executable, script, "worker", "--listen", "127.0.0.1:0", "--once", *worker_args],
+                               stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline() # "Listening on host:port"
+    if not line.startswith("Listening on "):
+        process.kill()
+        raise OSError("Local worker failed to start")
+    return process, parse_address(line.split()[-1])
+
+
+class ShardedPool(BasePool):
+    """
+    A check pool that runs nothing itself: every target goes to the worker
+    that owns its host on a consistent hash ring, and results come back
+    into `result_queue`. Has the CheckPool interface, so scan, monitor and
+    the GUI can use it unchanged.
+
+    local    -- number of worker processes to start on this machine
+    remote   -- 'host:port' addresses of workers started with `sslwatch2.py worker`
+    worker_args -- command line options passed to the local workers
+    """
+    def __init__(self, result_queue, local=0, remote=(), worker_args=(), cache=None):
+        super().__init__()
+        self.result_queue = result_queue
+        self.cache = cache # Answered here, so workers only see targets that need a check
+        self._results = cache.wrap_queue(result_queue) if cache else result_queue
+        self.local = local
+        self.remote = list(remote)
+        self.worker_args = list(worker_args)
+
+        # --- State ---
+        self.connections = {}
+        self.ring = None
+
+    def start(self):
+        if not self.local and not self.remote:
+            raise ValueError("A sharded pool needs at least one worker")
+        try:
+            for i in range(self.local):
+                process, address = start_local_worker(self.worker_args)
+                self._connect(f"local-{i}", address, process)
+            for address in self.remote:
+                try:
+                    self._connect(address, parse_address(address))
+                except OSError as e:
+                    # The ring is built from the workers that answered, so the others' shards move to them
+                    print(f"Skipping worker {address}: {e}", file=sys.stderr)
+        except BaseException:
+            self.cancel()
+            raise
+        if not self.connections:
+            raise OSError("No sharding worker could be reached")
+        self.ring = HashRing(self.connections)
+        return self
+
+    def _connect(self, name, address, process=None):
+        try:
+            connection = _WorkerConnection(name, address, process)
+        except OSError:
+            if process is not None:
+                process.kill()
+            raise
+        try:
+            ready = json.loads(connection.rfile.readline() or "{}")
+        except (OSError, ValueError) as e:
+            connection.close()
+            raise OSError(f"Worker {name} did not greet: {e}")
+        connection.sock.settimeout(None)
+        connection.concurrency = ready.get("concurrency", 0)
+        self.connections[name] = connection
+        threading.Thread(target=self._read_results, args=(connection,), daemon=True).start()
+
+    @property
+    def concurrency(self):
+        return max(1, sum(connection.concurrency for connection in self.connections.values()))
+
+    def submit(self, domain):
+        """Sends a domain to the worker owning its shard, blocking while that worker is backed up."""
+        if self.cancel_event.is_set():
+            return False
+        cached = self.cache.get(domain) if self.cache else None
+        if cached is not None:
+            with self._lock:
+                self.submitted += 1
+                self.completed += 1
+            self.result_queue.put(cached)
+            return True
+        connection = self.connections[self.ring.node_for(shard_key(domain))]
+        with self._lock:
+            self.submitted += 1
+            connection.outstanding[domain] = connection.outstanding.get(domain, 0) + 1
+        try:
+            connection.send({"target": domain})
+        except OSError:
+            with self._lock:
+                owed = connection.outstanding.get(domain, 0) # Unless _read_results already failed it
+                if owed > 1:
+                    connection.outstanding[domain] = owed - 1
+                else:
+                    connection.outstanding.pop(domain, None)
+            if owed:
+                self._lost(connection, domain)
+        return True
+
+    def cancel(self):
+        """Drops every worker connection; workers abandon their shard when the coordinator goes away."""
+        self.cancel_event.set()
+        for connection in self.connections.values():
+            connection.close()
+
+    def join(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.busy and (deadline is None or time.monotonic() < deadline):
+            time.sleep(0.1)
+
+    def _read_results(self, connection):
+        try:
+            for line in connection.rfile:
+                result = CertRecord.from_dict(json.loads(line))
+                with self._lock:
+                    count = connection.outstanding.get(result.domain, 0)
+                    if count > 1:
+                        connection.outstanding[result.domain] = count - 1
+                    else:
+                        connection.outstanding.pop(result.domain, None)
+                    self.completed += 1
+                self._results.put(result)
+        except (OSError, ValueError):
+            pass
+        connection.shutdown() # Later submits fail straight away
+        if self.cancel_event.is_set():
+            return
+        # The worker went away: fail whatever it still owed us.
+        with self._lock:
+            lost = connection.outstanding
+            connection.outstanding = {}
+        for domain, count in lost.items():
+            for _ in range(count):
+                self._lost(connection, domain)
+
+    def _lost(self, connection, domain):
+        self.result_queue.put(CertRecord(domain, "ERROR", message=f"Lost connection to worker {connection.name}."))
+        with self._lock:
+            self.completed += 1
+
+
+class _ConnectionQueue:
+    """The worker's result queue: each result is written back to the coordinator as one JSON line."""
+    def __init__(self, sock):
+        self.sock = sock
+        self.lock = threading.Lock()
+
+    def put(self, result):
+        self.send(result.to_dict())
+
+    def send(self, message):
+        data = (json.dumps(message) + "\n").encode('utf-8')
+        with self.lock:
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                pass # The coordinator left; the read loop notices and cancels
+
+
+def _serve_coordinator(conn, checker_functions, pool_factory):
+    results = _ConnectionQueue(conn)
+    pool = pool_factory(checker_functions['ssl'], results).start()
+    results.send({"ready": True, "concurrency": pool.concurrency})
+    try:
+        for line in conn.makefile('r', encoding='utf-8'):
+            message = json.loads(line)
+            if "target" in message:
+                pool.submit(message["target"])
+    except (OSError, ValueError):
+        pass # A broken coordinator ends the session like a closed one
+    finally:
+        pool.cancel()
+
+
+def serve_worker(args, checker_functions, pool_factory):
+    """
+    Runs a worker for a sharding coordinator: accepts coordinators one at a
+    time on args.listen and checks the targets each one sends.
+    """
+    host, port = parse_address(args.listen)
+    server = socket.create_server((host, port))
+    print(f"Listening on {host}:{server.getsockname()[1]}", flush=True)
+    try:
+        while True:
+            conn, peer = server.accept()
+            with conn:
+                _serve_coordinator(conn, checker_functions, pool_factory)
+            if args.once:
+                return 0
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        server.close()
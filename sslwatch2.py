@@ -1,99 +1,248 @@
-import curses
-import ssl
-import socket
-from datetime import datetime, timezone
-import threading
-import queue
-import whois
-
-from gui import GUI
-def check_ssl_status(domain_name, result_queue):
-    """
-    Fetches a domain's SSL certificate and determines its expiration status.
-    This method is run in a separate thread and puts the result in a queue.
-    """
-    try:
-        context = ssl.create_default_context()
-        with socket.create_connection((domain_name, 443), timeout=5) as sock:
-            with context.wrap_socket(sock, server_hostname=domain_name) as ssock:
-                cert = ssock.getpeercert()
-
-        # Parse the expiration date string into a datetime object
-        exp_date_str = cert['notAfter']
-        exp_date = datetime.strptime(exp_date_str, '%b %d %H:%M:%S %Y %Z')
-        # Make the expiration date timezone-aware (it's in UTC/GMT)
-        exp_date = exp_date.replace(tzinfo=timezone.utc)
-
-        # Parse the issue date string
-        issue_date_str = cert['notBefore']
-        issue_date = datetime.strptime(issue_date_str, '%b %d %H:%M:%S %Y %Z')
-        issue_date_str_formatted = issue_date.strftime('%Y-%m-%d')
-
-        # Get issuer and subject details
-        issuer_dict = dict(x[0] for x in cert['issuer'])
-        subject_dict = dict(x[0] for x in cert['subject'])
-
-        now = datetime.now(timezone.utc)
-        days_left = (exp_date - now).days
-        exp_date_str_formatted = exp_date.strftime('%Y-%m-%d')
-
-        if days_left < 0:
-            status = "EXPIRED"
-        elif days_left <= 10:
-            status = "ALERT"
-        elif days_left <= 30:
-            status = "WARNING"
-        else:
-            status = "OK"
-        message = f"Status: {status}"
-
-        result = {
-            "domain": domain_name,
-            "subject_cn": subject_dict.get('commonName', 'N/A'),
-            "issuer_cn": issuer_dict.get('organizationName', issuer_dict.get('commonName', 'N/A')),
-            "issued_on": issue_date_str_formatted,
-            "expires_on": exp_date_str_formatted,
-            "days_left": days_left,
-            "status": status,
-            "message": message
-        }
-
-    except socket.gaierror:
-        result = {"domain": domain_name, "status": "ERROR", "message": f"Could not resolve hostname: '{domain_name}'."}
-    except (socket.timeout, ConnectionRefusedError):
-        result = {"domain": domain_name, "status": "ERROR", "message": f"Could not connect to '{domain_name}' on port 443."}
-    except ssl.SSLCertVerificationError as e:
-        result = {"domain": domain_name, "status": "ERROR", "message": f"SSL verification error for '{domain_name}': {e.reason}"}
-    except (ValueError, KeyError) as e:
-        result = {"domain": domain_name, "status": "ERROR", "message": f"Could not parse certificate for '{domain_name}'."}
-    except Exception as e:
-        result = {"domain": domain_name, "status": "ERROR", "message": f"An unexpected error occurred: {e}"}
-
-    result_queue.put(result)
-
-def get_whois_info(domain_name, result_queue):
-    """
-    Fetches whois information for a domain.
-    This method is run in a separate thread and puts the result in a queue.
-    """
-    try:
-        w = whois.whois(domain_name)
-        result = {"domain": domain_name, "status": "WHOIS_SUCCESS", "data": w.text}
-    except Exception as e:
-        result = {"domain": domain_name, "status": "WHOIS_ERROR", "data": f"Could not retrieve whois info for '{domain_name}':\n{e}"}
-    result_queue.put(result)
+import functools
+import os
+import sys
+
+from cache import DEFAULT_CACHE_PATH
+from checks import DEFAULT_RETRIES, DEFAULT_TIMEOUT, classify, configure, get_resolver, prefetch_addresses
+from resolver import DNS_TTL
+from workers import CheckPool, DEFAULT_ASYNC_CONCURRENCY, DEFAULT_CONCURRENCY, DEFAULT_HOST_INTERVAL, DEFAULT_IP_INTERVAL
+
+DEFAULT_WHOIS_CACHE_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_PATH), "whois.sqlite")
+DEFAULT_WORKER_ADDRESS = "127.0.0.1:7400" # Where 'sslwatch2.py worker' listens for a coordinator
 
-def main(stdscr):
+
+def main(stdscr, args):
     """The main function to run the TUI application."""
-    checker_functions = {'ssl': check_ssl_status, 'whois': get_whois_info}
-    ui = GUI(stdscr, checker_functions)
-    ui.run()
-        
-if __name__ == "__main__":
+    from gui import GUI
+    from whois_cache import WhoisCache, WhoisLayer
+    checker_functions = configure(args)
+    whois_cache = WhoisCache(path=args.whois_cache)
+    whois_layer = WhoisLayer(checker_functions['whois'], whois_cache)
+    checker_functions['whois'] = whois_layer.lookup
+    checker_functions['whois_prefetch'] = whois_layer.prefetch if args.whois_prefetch else None
+    cache = make_cache(args)
+    ui = GUI(stdscr, checker_functions, make_pool_factory(args, cache), attach_path=args.attach)
     try:
-        curses.wrapper(main)
+        ui.run()
+    finally:
+        if cache:
+            cache.close()
+        whois_cache.close()
+
+def run_tui(args):
+    """Runs the interactive curses interface. Curses is only imported here."""
+    import curses
+    try:
+        curses.wrapper(main, args)
     except curses.error as e:
         print(f"Curses error: {e}")
         print("Your terminal may not support colors or has other limitations.")
     except KeyboardInterrupt:
         print("\nExiting application.")
+
+def run_scan(args):
+    """Runs a non-interactive batch scan and returns the process exit code."""
+    from headless import scan
+    checker_functions = configure(args)
+    cache = make_cache(args)
+    try:
+        return scan(args, checker_functions, make_pool_factory(args, cache))
+    finally:
+        if cache:
+            print(cache.stats(), file=sys.stderr)
+            cache.close()
+
+def run_monitor(args):
+    """Runs the continuous monitoring daemon until interrupted."""
+    from monitor import run_monitor as monitor
+    checker_functions = configure(args)
+    return monitor(args, checker_functions, make_pool_factory(args)) # A cache would hide due re-checks
+
+def make_cache(args):
+    """Opens the result cache requested by --cache, or returns None."""
+    if not args.cache:
+        return None
+    from cache import ResultCache
+    return ResultCache(args.cache, refresh=args.refresh, classify=classify)
+
+def run_worker(args):
+    """Serves shards to a coordinator started with --shards/--workers until interrupted."""
+    from shard import serve_worker
+    checker_functions = configure(args)
+    cache = make_cache(args)
+    try:
+        return serve_worker(args, checker_functions, make_pool_factory(args, cache))
+    finally:
+        if cache:
+            cache.close()
+
+def worker_options(args):
+    """The command line options a local shard worker inherits from the coordinator."""
+    options = ["--engine", args.engine, "--host-interval", str(args.host_interval), "--ip-interval", str(args.ip_interval),
+               "--dns-ttl", str(args.dns_ttl), "--timeout", str(args.timeout), "--retries", str(args.retries)]
+    for flag, enabled in (("--all-addresses", args.all_addresses), ("--adaptive-timeout", args.adaptive_timeout)):
+        if enabled:
+            options.append(flag)
+    for option, value in (("--concurrency", args.concurrency), ("--cafile", args.cafile), ("--capath", args.capath)):
+        if value is not None:
+            options += [option, str(value)]
+    return options
+
+def make_pool_factory(args, cache=None):
+    """Returns a callable building the check pool selected by --engine, or a sharded one for --shards/--workers."""
+    if getattr(args, 'shards', 0) or getattr(args, 'workers', None):
+        from shard import ShardedPool
+        return lambda check_function, result_queue: ShardedPool(
+            result_queue, local=args.shards, remote=args.workers or (), worker_args=worker_options(args), cache=cache)
+    if args.engine == 'async':
+        from async_probe import AsyncCheckPool
+        concurrency = args.concurrency or DEFAULT_ASYNC_CONCURRENCY
+        return lambda check_function, result_queue: AsyncCheckPool(
+            result_queue, concurrency=concurrency, host_interval=args.host_interval, ip_interval=args.ip_interval,
+            cache=cache)
+    return functools.partial(CheckPool, concurrency=args.concurrency or DEFAULT_CONCURRENCY,
+                             host_interval=args.host_interval, ip_interval=args.ip_interval, cache=cache,
+                             prefetch=None if cache and not args.refresh else prefetch_addresses, # Cache hits need no DNS
+                             resolver=get_resolver())
+
+def worker_addresses(text):
+    """argparse type for --workers: a comma-separated list of HOST:PORT."""
+    import argparse
+    from shard import parse_address
+    addresses = [address.strip() for address in text.split(',') if address.strip()]
+    try:
+        for address in addresses:
+            parse_address(address)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+    return addresses
+
+def common_options(suppress=False):
+    """
+    The options shared by the interface and the subcommands. The
+    subcommands' copy is built with `suppress`, leaving out the defaults so
+    an option given before the subcommand is not reset by the subparser.
+    """
+    import argparse
+
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("-e", "--engine", choices=['threads', 'async'], default=default('threads'),
+                        help="Check engine: a thread pool or a single asyncio event loop (default: threads).")
+    common.add_argument("-c", "--concurrency", type=int, default=default(None),
+                        help=f"Number of checks to run at once (default: {DEFAULT_CONCURRENCY} threads, "
+                             f"{DEFAULT_ASYNC_CONCURRENCY} async).")
+    common.add_argument("--host-interval", type=float, default=default(DEFAULT_HOST_INTERVAL),
+                        help=f"Minimum seconds between checks of the same host (default: {DEFAULT_HOST_INTERVAL}).")
+    common.add_argument("--ip-interval", type=float, default=default(DEFAULT_IP_INTERVAL),
+                        help="Minimum seconds between checks of the same IP address (default: disabled).")
+    common.add_argument("--cafile", default=default(None),
+                        help="PEM file of CA certificates to trust instead of the system store.")
+    common.add_argument("--capath", default=default(None),
+                        help="Directory of CA certificates to trust instead of the system store.")
+    common.add_argument("--timeout", type=float, default=default(DEFAULT_TIMEOUT), metavar="SECONDS",
+                        help=f"Time budget of each check attempt for resolving, connecting and the TLS handshake "
+                             f"together (default: {DEFAULT_TIMEOUT}).")
+    common.add_argument("--adaptive-timeout", action='store_true', default=default(False),
+                        help="Shrink the budget to a multiple of the p99 latency seen so far in the run, "
+                             "with --timeout as the ceiling, so unreachable hosts fail fast.")
+    common.add_argument("--retries", type=int, default=default(DEFAULT_RETRIES), metavar="N",
+                        help=f"Retry checks that time out or are reset up to N times, with jittered backoff "
+                             f"(default: {DEFAULT_RETRIES}).")
+    common.add_argument("--dns-ttl", type=float, default=default(DNS_TTL), metavar="SECONDS",
+                        help=f"Seconds to reuse resolved addresses when the record's TTL is unknown, "
+                             f"i.e. without dnspython installed (default: {DNS_TTL}).")
+    common.add_argument("--all-addresses", action='store_true', default=default(False),
+                        help="Check every IPv4 and IPv6 address of each host and flag hosts whose "
+                             "backends serve different certificates.")
+    return common
+
+def cache_options(suppress=False):
+    """
+    The --cache and --refresh options, for every command but monitor, where
+    a cached result would hide a re-check that is due. `suppress` as for
+    common_options().
+    """
+    import argparse
+
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    cache = argparse.ArgumentParser(add_help=False)
+    cache.add_argument("--cache", nargs='?', const=DEFAULT_CACHE_PATH, default=default(None), metavar="PATH",
+                       help=f"Reuse results from an on-disk cache (default path: {DEFAULT_CACHE_PATH}).")
+    cache.add_argument("--refresh", action='store_true', default=default(False),
+                       help="Re-check every domain even if the cache holds a fresh result.")
+    return cache
+
+def sharding_options(suppress=False):
+    """The --shards and --workers options; `suppress` as for common_options()."""
+    import argparse
+
+    def default(value):
+        return argparse.SUPPRESS if suppress else value
+
+    sharding = argparse.ArgumentParser(add_help=False)
+    sharding.add_argument("--shards", type=int, default=default(0), metavar="N",
+                          help="Split the targets by host across N local worker processes.")
+    sharding.add_argument("--workers", type=worker_addresses, default=default(None), metavar="HOST:PORT[,...]",
+                          help="Also send shards to workers started with 'sslwatch2.py worker' on other machines.")
+    return sharding
+
+def parse_args(argv=None):
+    import argparse # Only the command line needs it, not library use of the checks
+    # The subcommands' copies, which leave options given before the subcommand alone
+    common, cache, sharding = common_options(True), cache_options(True), sharding_options(True)
+    parser = argparse.ArgumentParser(description="Check the SSL certificate status of websites.",
+                                     parents=[common_options(), cache_options(), sharding_options()])
+    parser.add_argument("--attach", metavar="STATE",
+                        help="Show the live results of a monitor writing to the STATE file.")
+    parser.add_argument("--whois-cache", nargs='?', const=DEFAULT_WHOIS_CACHE_PATH, default=None, metavar="PATH",
+                        help=f"Also keep WHOIS answers on disk (default path: {DEFAULT_WHOIS_CACHE_PATH}).")
+    parser.add_argument("--whois-prefetch", action='store_true',
+                        help="Fetch WHOIS data in the background for the rows on screen.")
+    commands = parser.add_subparsers(dest="command")
+    scan = commands.add_parser("scan", parents=[common, cache, sharding],
+                               help="Check a file of domains without the curses interface.",
+                               description="Check a file of domains and stream each result to stdout. "
+                                           "Exits with status 1 if any certificate is EXPIRED or ALERT.")
+    scan.add_argument("-f", "--file", required=True, help="File with one domain per line ('-' for stdin).")
+    scan.add_argument("--format", choices=['ndjson', 'csv'], default='ndjson', help="Output format (default: ndjson).")
+    scan.add_argument("--certs", metavar="PATH",
+                      help="Also write one NDJSON line per distinct certificate, listing the hosts that serve it.")
+    scan.add_argument("--deadline", type=float, metavar="SECONDS",
+                      help="Stop after SECONDS and report every target not yet checked as UNKNOWN.")
+    scan.add_argument("--metrics", metavar="PATH",
+                      help="Write per-phase latency histograms to PATH in the Prometheus text format at the end.")
+    monitor = commands.add_parser("monitor", parents=[common, sharding],
+                                  help="Keep a file of domains under continuous watch.",
+                                  description="Re-check each domain on a schedule that follows its last status, "
+                                              "logging status changes to stdout as NDJSON.")
+    monitor.add_argument("-f", "--file", required=True, help="File with one domain per line ('-' for stdin).")
+    monitor.add_argument("--state", metavar="PATH", help="Write a state snapshot here for 'sslwatch2.py --attach PATH'.")
+    monitor.add_argument("--metrics", metavar="PATH",
+                         help="Keep per-phase latency histograms updated in PATH in the Prometheus text format.")
+    worker = commands.add_parser("worker", parents=[common, cache],
+                                 help="Check the shard of targets a coordinator sends.",
+                                 description="Listen for a coordinator started with --workers and check the "
+                                             "targets it sends, streaming results back. Only listen on "
+                                             "trusted networks: the protocol has no authentication.")
+    worker.add_argument("--listen", default=DEFAULT_WORKER_ADDRESS, metavar="HOST:PORT",
+                        help=f"Address to listen on (default: {DEFAULT_WORKER_ADDRESS}).")
+    worker.add_argument("--once", action='store_true', help="Exit after the first coordinator disconnects.")
+    args = parser.parse_args(argv)
+    if args.command == "monitor" and (args.cache or args.refresh):
+        parser.error("monitor does not use --cache or --refresh: a cached result would hide a due re-check")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.command == "scan":
+        sys.exit(run_scan(args))
+    if args.command == "monitor":
+        sys.exit(run_monitor(args))
+    if args.command == "worker":
+        sys.exit(run_worker(args))
+    run_tui(args)
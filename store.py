@@ -0,0 +1,166 @@
+import bisect
+import operator
+import re
+
+
+class ResultStore:
+    """
+    Append-only storage for the results shown in the interface. Appending
+    never copies earlier rows, and `version` goes up on every change so the
+    renderer can tell whether there is anything new to paint.
+    """
+    def __init__(self, results=()):
+        self._rows = list(results)
+        self.version = 0
+        self.generation = 0 # Goes up when the rows are replaced rather than appended to
+
+    def append(self, result):
+        self._rows.append(result)
+        self.version += 1
+        return len(self._rows) - 1 # Index of the new row
+
+    def replace(self, results):
+        """Starts over with `results`, e.g. for a new batch or a reloaded monitor state."""
+        self._rows = list(results)
+        self.version += 1
+        self.generation += 1
+
+    def page(self, start, count):
+        """The rows of one screen page, without copying the rest of the store."""
+        return self._rows[start:start + count]
+
+    def __getitem__(self, index):
+        return self._rows[index]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+STATUS_ORDER = {"EXPIRED": 0, "ALERT": 1, "ERROR": 2, "WARNING": 3, "OK": 4} # Most urgent first
+NO_DAYS = float('inf') # Sorts results without a days_left after every certificate
+
+
+def _days_left(result):
+    days_left = result.get("days_left")
+    return days_left if isinstance(days_left, int) else NO_DAYS
+
+
+SORT_KEYS = {
+    "arrival": None, # Row number in the store
+    "days_left": _days_left,
+    "status": lambda result: (STATUS_ORDER.get(result.get("status"), len(STATUS_ORDER)), _days_left(result)),
+    "issuer_cn": lambda result: (result.get("issuer_cn") or "").lower(),
+    "domain": lambda result: result.get("domain") or "",
+}
+
+DAYS_TERM = re.compile(r"days(<=|>=|<|>|=)(-?\d+)$")
+COMPARISONS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "=": operator.eq}
+
+
+def parse_filter(query):
+    """
+    Turns a filter query into a predicate over results. Every whitespace
+    separated term must match: 'status:ERROR', 'issuer:encrypt', 'days<30'
+    (also <=, >, >=, =), or plain text found in the domain, subject or issuer.
+    Matching is case-insensitive.
+    """
+    tests = []
+    for term in query.lower().split():
+        days = DAYS_TERM.match(term)
+        if days:
+            compare, limit = COMPARISONS[days.group(1)], int(days.group(2))
+            tests.append(lambda r, compare=compare, limit=limit:
+                         isinstance(r.get("days_left"), int) and compare(r["days_left"], limit))
+        elif term.startswith("status:"):
+            tests.append(lambda r, status=term[7:]: (r.get("status") or "").lower() == status)
+        elif term.startswith("issuer:"):
+            tests.append(lambda r, text=term[7:]: text in (r.get("issuer_cn") or "").lower())
+        else:
+            tests.append(lambda r, text=term: any(text in (r.get(field) or "").lower()
+                                                  for field in ("domain", "subject_cn", "issuer_cn")))
+    return lambda result: all(test(result) for test in tests)
+
+
+class ResultIndex:
+    """
+    A sorted and filtered view over a ResultStore. Rows added to the store
+    are placed with a binary search by sync(), so only a new sort key or
+    filter touches every row; reversing the order is free.
+    """
+    def __init__(self, store, sort_key="arrival", reverse=False, query=""):
+        self.store = store
+        self.sort_key = sort_key
+        self.reverse = reverse
+        self.query = query
+        self._match = parse_filter(query)
+        self._keys = [] # Sort keys, ascending
+        self._rows = [] # Store row numbers, parallel to _keys
+        self._indexed = 0 # Store rows looked at so far
+        self._generation = None
+        self.sync()
+
+    def _key(self, row):
+        key_function = SORT_KEYS[self.sort_key]
+        return row if key_function is None else key_function(self.store[row])
+
+    def _build(self, rows):
+        """Sorts `rows` (in store order, already filtered) by the current key."""
+        keys = [self._key(row) for row in rows]
+        order = sorted(range(len(rows)), key=keys.__getitem__) # Stable, so ties stay in arrival order
+        self._keys = [keys[i] for i in order]
+        self._rows = [rows[i] for i in order]
+
+    def sync(self):
+        """
+        Indexes rows added to the store since the last call. Returns the first
+        view position that changed, or None if the view is unchanged.
+        """
+        if self._generation != self.store.generation:
+            self._generation = self.store.generation
+            self._indexed = len(self.store)
+            self._build([row for row in range(self._indexed) if self._match(self.store[row])])
+            return 0
+        first = None
+        for row in range(self._indexed, len(self.store)):
+            if not self._match(self.store[row]):
+                continue
+            key = self._key(row)
+            position = bisect.bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._rows.insert(position, row)
+            if self.reverse:
+                position = len(self._rows) - 1 - position # Rows shown above it moved down
+            first = position if first is None else min(first, position)
+        self._indexed = len(self.store)
+        return first
+
+    def set_sort(self, sort_key, reverse=False):
+        self.reverse = reverse
+        if sort_key != self.sort_key:
+            self.sync() # Place pending rows under the old key before re-sorting
+            self.sort_key = sort_key
+            self._build(sorted(self._rows))
+
+    def set_filter(self, query):
+        self.query = query
+        self._match = parse_filter(query)
+        self._generation = None # Rescan the whole store
+        self.sync()
+
+    def page(self, start, count):
+        """The results at view positions start..start+count."""
+        if self.reverse:
+            end = len(self._rows) - start
+            rows = self._rows[max(0, end - count):max(0, end)][::-1]
+        else:
+            rows = self._rows[start:start + count]
+        return [self.store[row] for row in rows]
+
+    def __getitem__(self, position):
+        return self.store[self._rows[-1 - position] if self.reverse else self._rows[position]]
+
+    def __len__(self):
+        return len(self._rows)
@@ -0,0 +1,186 @@
+import hashlib
+import ipaddress
+import math
+import sys
+from urllib.parse import urlsplit
+
+DEFAULT_PORT = 443
+EXACT_DEDUPE_LIMIT = 100000 # Unique targets de-duplicated exactly before falling back to a Bloom filter
+SCHEME_PORTS = {'https': 443, 'http': 443, 'ldaps': 636, 'imaps': 993, 'pop3s': 995, 'smtps': 465}
+
+def split_target(target):
+    """
+    Splits a 'host[:port]' target into its host name and port.
+    IPv6 literals must be bracketed when a port is given, e.g. '[::1]:8443'.
+    """
+    if target.startswith('['):
+        host, _, rest = target[1:].partition(']')
+        port = rest[1:] if rest.startswith(':') else ''
+    elif target.count(':') == 1:
+        host, _, port = target.partition(':')
+    else:
+        host, port = target, ''
+    return host, int(port) if port else DEFAULT_PORT
+
+
+def _is_ipv6_literal(text):
+    try:
+        return ipaddress.ip_address(text).version == 6
+    except ValueError:
+        return False
+
+
+def normalize_target(line):
+    """
+    Normalizes one line of an import file to 'host[:port]', or returns None
+    for blank lines and comments. URLs are reduced to their host and port,
+    host names are lower-cased and the default port is dropped.
+    """
+    line = line.split('#', 1)[0].strip()
+    if not line:
+        return None
+    if '://' not in line:
+        if _is_ipv6_literal(line):
+            line = f"[{line}]" # A bare IPv6 address, whose colons urlsplit would take for a port
+        line = '//' + line # Let urlsplit treat the line as a network location
+    parts = urlsplit(line)
+    host = (parts.hostname or '').rstrip('.')
+    if not host:
+        return None
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        pass # Leave it for the checker to report
+    port = parts.port # Raises ValueError for a malformed port
+    if port is None:
+        port = SCHEME_PORTS.get(parts.scheme, DEFAULT_PORT)
+    if ':' in host:
+        host = f"[{host}]"
+    return host if port == DEFAULT_PORT else f"{host}:{port}"
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter over strings."""
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') % (self.size - 1) + 1 # Never zero, or every probe would hit one bit
+        return [(h1 + i * h2 + (i * i * i - i) // 6) % self.size for i in range(self.hashes)]
+
+    def __contains__(self, item):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    def add(self, item):
+        """Adds `item` and returns True if it was (probably) already present."""
+        present = True
+        for pos in self._positions(item):
+            mask = 1 << (pos & 7)
+            if not self.bits[pos >> 3] & mask:
+                present = False
+                self.bits[pos >> 3] |= mask
+        if not present:
+            self.count += 1
+        return present
+
+
+class ScalableBloomFilter:
+    """
+    A Bloom filter that adds larger, stricter stages as it fills, so memory
+    grows with the number of unique items (a few bytes each) while the total
+    false-positive rate stays below `error_rate`.
+    """
+    def __init__(self, initial_capacity=100000, error_rate=1e-6):
+        self.error_rate = error_rate
+        self.stages = [BloomFilter(initial_capacity, error_rate / 2)]
+
+    def add(self, item):
+        """Adds `item` and returns True if it was (probably) already present."""
+        if any(item in stage for stage in self.stages[:-1]):
+            return True
+        current = self.stages[-1]
+        if current.count >= current.capacity:
+            if item in current:
+                return True
+            error = self.error_rate / 2 ** (len(self.stages) + 1)
+            current = BloomFilter(current.capacity * 2, error)
+            self.stages.append(current)
+        return current.add(item)
+
+
+class SeenTargets:
+    """
+    The targets read so far, for de-duplication. The first `exact_limit`
+    unique targets are kept in a set. Later ones go into a Bloom filter to
+    keep memory flat; a hit there may be a false positive, so those
+    duplicates are counted in `probable`.
+    """
+    def __init__(self, exact_limit=EXACT_DEDUPE_LIMIT):
+        self.exact_limit = exact_limit
+        self.probable = 0
+        self._exact = set()
+        self._bloom = None
+
+    def add(self, target):
+        """Adds `target` and returns True if it was seen before (probably, past `exact_limit`)."""
+        if target in self._exact:
+            return True
+        if len(self._exact) < self.exact_limit:
+            self._exact.add(target)
+            return False
+        if self._bloom is None:
+            self._bloom = ScalableBloomFilter()
+        if self._bloom.add(target):
+            self.probable += 1
+            return True
+        return False
+
+
+class TargetReader:
+    """
+    Lazily yields normalized, de-duplicated targets from an import file ('-'
+    reads stdin). The file is opened immediately so a bad path fails fast.
+    `read` and `unique` can be polled from another thread for progress.
+    `streaming` is True for pipes and terminals, where reading may block.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = sys.stdin if path == '-' else open(path, 'r', errors='replace')
+        self.streaming = not self.file.seekable()
+        self.read = 0
+        self.unique = 0
+        self.invalid = 0
+        self.done = False
+        self._seen = SeenTargets()
+
+    def __iter__(self):
+        try:
+            for line in self.file:
+                self.read += 1
+                try:
+                    target = normalize_target(line)
+                except ValueError:
+                    self.invalid += 1
+                    continue
+                if target is None or self._seen.add(target):
+                    continue
+                self.unique += 1
+                yield target
+        finally:
+            self.done = True
+            if self.file is not sys.stdin:
+                self.file.close()
+
+    def progress(self):
+        progress = f"{self.read} read / {self.unique} unique"
+        if self.invalid:
+            progress += f" / {self.invalid} invalid"
+        if self._seen.probable:
+            progress += f" / {self._seen.probable} probable duplicates" # May include Bloom filter false positives
+        return progress
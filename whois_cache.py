@@ -0,0 +1,168 @@
+import ipaddress
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+from targets import split_target
+from workers import RateLimiter, SingleFlight
+
+WHOIS_TTL = 24 * 3600      # Seconds a WHOIS answer is reused
+WHOIS_CACHE_SIZE = 1024    # Registrable domains kept in memory
+WHOIS_INTERVAL = 2.0       # Minimum seconds between queries to the same WHOIS server
+PREFETCH_BACKLOG = 64      # Queued prefetches; further requests are dropped
+
+# Two-label public suffixes under which registrations happen one level deeper.
+# A small built-in list rather than the full Public Suffix List.
+MULTI_LABEL_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "me.uk", "ltd.uk", "plc.uk", "net.uk",
+    "com.au", "net.au", "org.au", "edu.au", "gov.au",
+    "co.nz", "org.nz", "net.nz", "co.jp", "ne.jp", "or.jp", "ac.jp",
+    "com.br", "net.br", "org.br", "com.cn", "net.cn", "org.cn",
+    "co.in", "net.in", "org.in", "co.za", "org.za", "com.mx", "com.ar",
+    "com.tr", "com.sg", "com.hk", "co.kr", "co.il", "com.tw",
+}
+
+
+def registrable_domain(target):
+    """
+    Reduces a target to the domain its WHOIS record belongs to, e.g.
+    'a.b.example.co.uk:8443' -> 'example.co.uk'. IP addresses are returned as is.
+    """
+    try:
+        host, _ = split_target(target)
+    except ValueError:
+        host = target
+    host = host.strip('[]').rstrip('.').lower()
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    labels = host.split('.')
+    depth = 3 if '.'.join(labels[-2:]) in MULTI_LABEL_SUFFIXES else 2
+    return '.'.join(labels[-depth:])
+
+
+def whois_server_key(domain):
+    """The key WHOIS rate limits apply to: registries answer per top-level domain."""
+    return domain.rsplit('.', 1)[-1]
+
+
+class WhoisCache:
+    """
+    WHOIS answers keyed on the registrable domain, held in an in-memory LRU
+    with a TTL and optionally persisted to an SQLite file.
+    """
+    def __init__(self, capacity=WHOIS_CACHE_SIZE, ttl=WHOIS_TTL, path=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._entries = OrderedDict() # key -> (fetched_at, data)
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            import sqlite3 # Loaded only when answers are kept on disk, as in cache.ResultCache
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS whois (key TEXT PRIMARY KEY, data TEXT NOT NULL, fetched_at REAL NOT NULL)")
+            self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[1]
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                "SELECT fetched_at, data FROM whois WHERE key = ? AND fetched_at > ?", (key, now - self.ttl)).fetchone()
+            if row is None:
+                return None
+            self._remember(key, row[0], row[1])
+            return row[1]
+
+    def put(self, key, data):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, data)
+            if self._conn is not None:
+                self._conn.execute("INSERT OR REPLACE INTO whois (key, data, fetched_at) VALUES (?, ?, ?)",
+                                   (key, data, now))
+                self._conn.commit()
+
+    def _remember(self, key, fetched_at, data):
+        self._entries[key] = (fetched_at, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class WhoisLayer:
+    """
+    Wraps get_whois_info with a cache keyed on the registrable domain.
+    Concurrent requests for the same key share one query, and queries to
+    each WHOIS server are rate limited. lookup() has the checker signature.
+    """
+    def __init__(self, fetch_function, cache=None, interval=WHOIS_INTERVAL):
+        self.fetch_function = fetch_function
+        self.cache = cache or WhoisCache()
+        self.limiter = RateLimiter(interval)
+        self._flights = SingleFlight()
+        self._prefetch_queue = queue.Queue(maxsize=PREFETCH_BACKLOG)
+        self._prefetched = set() # Keys already tried, so failures are not retried on every redraw
+        self._prefetcher = None
+
+    def lookup(self, domain_name, result_queue):
+        """Puts a WHOIS_SUCCESS/WHOIS_ERROR result for `domain_name` on `result_queue`."""
+        result = dict(self._resolve(registrable_domain(domain_name)), domain=domain_name)
+        result_queue.put(result)
+
+    def _resolve(self, key):
+        data = self.cache.get(key)
+        if data is not None:
+            return {"status": "WHOIS_SUCCESS", "data": data}
+        fallback = {"status": "WHOIS_ERROR", "data": f"Could not retrieve whois info for '{key}'."}
+        return self._flights.run(key, lambda: self._query(key), fallback)
+
+    def _query(self, key):
+        self.limiter.wait(whois_server_key(key))
+        answer = queue.Queue()
+        self.fetch_function(key, answer)
+        result = answer.get()
+        if result.get("status") == "WHOIS_SUCCESS" and result.get("data"):
+            self.cache.put(key, result["data"])
+        return result
+
+    def prefetch(self, domains):
+        """Warms the cache for `domains` in the background, dropping requests when busy."""
+        if self._prefetcher is None:
+            self._prefetcher = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._prefetcher.start()
+        for domain in domains:
+            key = registrable_domain(domain)
+            if key in self._prefetched:
+                continue
+            try:
+                self._prefetch_queue.put_nowait(key)
+            except queue.Full:
+                break
+            if len(self._prefetched) >= WHOIS_CACHE_SIZE * 10:
+                self._prefetched.clear()
+            self._prefetched.add(key)
+
+    def _prefetch_loop(self):
+        while True:
+            key = self._prefetch_queue.get()
+            if self.cache.get(key) is None:
+                self._resolve(key)
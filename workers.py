@@ -0,0 +1,249 @@
+import socket
+import threading
+import queue
+import time
+
+from targets import split_target
+
+DEFAULT_CONCURRENCY = 64      # Worker threads per pool
+DEFAULT_ASYNC_CONCURRENCY = 2000 # Handshakes in flight on the async engine's event loop
+DEFAULT_HOST_INTERVAL = 1.0   # Minimum seconds between checks of the same host
+DEFAULT_IP_INTERVAL = 0.0     # Minimum seconds between checks of the same IP (0 disables)
+
+
+class RateLimiter:
+    """
+    Enforces a minimum interval between events that share the same key.
+    Callers reserve the next free slot for their key and sleep until it arrives.
+    """
+    PRUNE_THRESHOLD = 10000
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key):
+        """Reserves the next free slot for `key` and returns the seconds until it arrives."""
+        if self.interval <= 0 or key is None:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(key, now))
+            self._next_slot[key] = slot + self.interval
+            if len(self._next_slot) > self.PRUNE_THRESHOLD:
+                self._next_slot = {k: v for k, v in self._next_slot.items() if v > now}
+        return slot - now
+
+    def wait(self, key, cancel_event=None):
+        """Blocks until `key` may be used again. Returns False if cancelled while waiting."""
+        delay = self.reserve(key)
+        if delay <= 0:
+            return True
+        if cancel_event is not None:
+            return not cancel_event.wait(delay)
+        time.sleep(delay)
+        return True
+
+
+class SingleFlight:
+    """
+    Merges concurrent calls that share a key: the first caller runs the
+    function and the others wait for its value instead of repeating the work.
+    """
+    def __init__(self):
+        self._in_flight = {} # key -> {'done': Event, 'value': ...} of the call in progress
+        self._lock = threading.Lock()
+
+    def run(self, key, function, fallback, timeout=None):
+        """
+        Returns function() for `key`, or the value of the call already in
+        flight for it. Waiters get `fallback` if that call raised. With a
+        `timeout` the call runs on its own thread and socket.timeout is
+        raised if it takes longer; the call still completes in the background.
+        """
+        with self._lock:
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = {"done": threading.Event(), "value": None}
+        if leader and timeout is None:
+            return self._lead(key, function, fallback, flight)
+        if leader:
+            threading.Thread(target=self._lead, args=(key, function, fallback, flight), daemon=True).start()
+        if not flight["done"].wait(timeout):
+            raise socket.timeout("timed out")
+        return flight["value"]
+
+    def _lead(self, key, function, fallback, flight):
+        try:
+            flight["value"] = function()
+            return flight["value"]
+        finally:
+            if flight["value"] is None:
+                flight["value"] = fallback
+            with self._lock:
+                del self._in_flight[key]
+            flight["done"].set()
+
+
+class BasePool:
+    """
+    The bookkeeping every check pool shares: the submitted and completed
+    counts, cancellation, and feeder threads that pull from an iterable only
+    as fast as the pool takes work. Subclasses implement start(), submit(),
+    cancel() and join(), and count each submitted domain as completed.
+    """
+    def __init__(self):
+        self.cancel_event = threading.Event()
+        self.submitted = 0
+        self.completed = 0
+        self._feeders = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        """Number of domains submitted but not yet completed."""
+        with self._lock:
+            return self.submitted - self.completed
+
+    @property
+    def busy(self):
+        """True while work is pending, running, or still being fed."""
+        if self.cancel_event.is_set():
+            return False
+        with self._lock:
+            return self._feeders > 0 or self.submitted > self.completed
+
+    def feed(self, domains):
+        """
+        Starts a feeder thread that pulls from the `domains` iterable only as
+        fast as the pool takes work, so a large file is never read ahead and
+        a slow input never blocks the checks.
+        """
+        with self._lock:
+            self._feeders += 1
+
+        def _feed():
+            try:
+                for domain in domains:
+                    if not self._feed_one(domain):
+                        break
+            finally:
+                with self._lock:
+                    self._feeders -= 1
+
+        threading.Thread(target=_feed, daemon=True).start()
+
+    def _feed_one(self, domain):
+        """Hands a fed domain to the pool, blocking while it is full. Returns False to stop feeding."""
+        return self.submit(domain)
+
+
+class CheckPool(BasePool):
+    """
+    A fixed-size pool of worker threads that runs a checker function over a
+    lazily fed work queue. Results are delivered through `result_queue`
+    exactly as if the checker had been run in its own thread. With a `cache`
+    (see cache.ResultCache), fresh cached results skip the check entirely.
+    `prefetch`, if given, is called with each queued domain so work such as
+    DNS resolution can start while it waits for a worker. The `resolver`
+    (see resolver.Resolver) finds the address --ip-interval throttles on;
+    pass the checker's own so the check reuses the answer.
+    """
+    def __init__(self, check_function, result_queue, concurrency=DEFAULT_CONCURRENCY,
+                 host_interval=DEFAULT_HOST_INTERVAL, ip_interval=DEFAULT_IP_INTERVAL, cache=None, prefetch=None,
+                 resolver=None):
+        super().__init__()
+        self.check_function = check_function
+        self.prefetch = prefetch
+        if resolver is None and ip_interval > 0:
+            from resolver import Resolver
+            resolver = Resolver()
+        self.resolver = resolver
+        self.result_queue = result_queue
+        self.cache = cache
+        self._results = cache.wrap_queue(result_queue) if cache else result_queue
+        self.concurrency = max(1, concurrency)
+        self.host_limiter = RateLimiter(host_interval)
+        self.ip_limiter = RateLimiter(ip_interval)
+
+        # --- State ---
+        self.work_queue = queue.Queue(maxsize=self.concurrency * 4)
+        self._workers = []
+
+    def start(self):
+        for _ in range(self.concurrency):
+            worker = threading.Thread(target=self._worker_loop, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        return self
+
+    def submit(self, domain):
+        """Queues a single domain, blocking while the work queue is full."""
+        while not self.cancel_event.is_set():
+            try:
+                with self._lock:
+                    self.submitted += 1
+                self.work_queue.put(domain, timeout=0.2)
+                if self.prefetch:
+                    self.prefetch([domain])
+                return True
+            except queue.Full:
+                with self._lock:
+                    self.submitted -= 1
+        return False
+
+    def cancel(self):
+        """Stops feeding, discards queued work and lets the workers exit."""
+        self.cancel_event.set()
+        while True:
+            try:
+                self.work_queue.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self.completed += 1
+
+    def join(self, timeout=None):
+        for worker in self._workers:
+            worker.join(timeout)
+
+    def _worker_loop(self):
+        while not self.cancel_event.is_set():
+            try:
+                domain = self.work_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                cached = self.cache.get(domain) if self.cache else None
+                if cached is not None:
+                    self.result_queue.put(cached)
+                elif self._throttle(domain):
+                    self.check_function(domain, self._results)
+            finally:
+                with self._lock:
+                    self.completed += 1
+
+    def _throttle(self, domain):
+        try:
+            host, port = split_target(domain)
+        except ValueError:
+            return True # Let the checker report the malformed target
+        if not self.host_limiter.wait(host, self.cancel_event):
+            return False
+        if self.ip_limiter.interval > 0:
+            if not self.ip_limiter.wait(first_address(self.resolver, host, port), self.cancel_event):
+                return False
+        return True
+
+
+def first_address(resolver, host, port):
+    """
+    The IP a check of host:port connects to first, the key --ip-interval
+    throttles on, or None if it cannot be resolved.
+    """
+    try:
+        return resolver.resolve(host, port)[0][4][0]
+    except (OSError, UnicodeError, IndexError):
+        return None # Let the checker report the resolution error